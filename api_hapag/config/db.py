@@ -1,24 +1,48 @@
 import os
+import threading
 from contextlib import contextmanager
 from mysql.connector import pooling
 from dotenv import load_dotenv
 
+from api_hapag.config.http import MAX_WORKERS
+
 load_dotenv()
 
-_pool = pooling.MySQLConnectionPool(
-    pool_name="hapag_pool",
-    pool_size=5,
-    host=os.getenv("DB_HOST", "localhost"),
-    port=int(os.getenv("DB_PORT", "3306")),
-    user=os.getenv("DB_USER", "root"),
-    password=os.getenv("DB_PASSWORD", ""),
-    database=os.getenv("DB_NAME", "feat_pc"),
-)
+# Cada thread do refresh (HAPAG_MAX_WORKERS) usa uma conexão; o pool acompanha
+# esse número para não ficar menor que o paralelismo configurado.
+POOL_SIZE = max(5, MAX_WORKERS)
+
+_pool = None
+_pool_lock = threading.Lock()
+
+# MySQLConnectionPool lança PoolError quando todas as conexões estão em uso.
+# O semáforo faz as threads esperarem por uma conexão livre.
+_slots = threading.BoundedSemaphore(POOL_SIZE)
+
+
+def _get_pool() -> pooling.MySQLConnectionPool:
+    """Cria o pool na primeira utilização (evita abrir conexões no import)."""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = pooling.MySQLConnectionPool(
+                    pool_name="hapag_pool",
+                    pool_size=POOL_SIZE,
+                    host=os.getenv("DB_HOST", "localhost"),
+                    port=int(os.getenv("DB_PORT", "3306")),
+                    user=os.getenv("DB_USER", "root"),
+                    password=os.getenv("DB_PASSWORD", ""),
+                    database=os.getenv("DB_NAME", "feat_pc"),
+                )
+    return _pool
+
 
 @contextmanager
 def get_conn():
-    conn = _pool.get_connection()
-    try:
-        yield conn
-    finally:
-        conn.close()
+    with _slots:
+        conn = _get_pool().get_connection()
+        try:
+            yield conn
+        finally:
+            conn.close()
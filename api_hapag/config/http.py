@@ -0,0 +1,32 @@
+"""
+http.py
+Sessão HTTP compartilhada (keep-alive) para as APIs da Hapag-Lloyd.
+"""
+
+import os
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Número de threads do refresh de disputas antigas (e tamanho do pool por host)
+MAX_WORKERS = int(os.getenv("HAPAG_MAX_WORKERS", "5"))
+
+# Um único adapter = um único pool de conexões por host (*.api.hlag.cloud),
+# compartilhado por todas as sessões. O pool do urllib3 é thread-safe.
+_adapter = HTTPAdapter(pool_connections=4, pool_maxsize=MAX_WORKERS)
+
+# Cada thread tem sua própria Session (cookies/estado não são compartilhados),
+# mas todas reutilizam as conexões abertas do adapter acima.
+_local = threading.local()
+
+
+def get_session() -> requests.Session:
+    session = getattr(_local, "session", None)
+    if session is None:
+        session = requests.Session()
+        session.mount("https://", _adapter)
+        _local.session = session
+    return session
@@ -13,6 +13,8 @@ sys.path.insert(0, str(parent_dir))
 
 from api_hapag.utils.logger import setup_logger
 from api_hapag.services.token_service import get_valid_token
+from api_hapag.config.http import MAX_WORKERS
+from api_hapag.migrate_database import verificar_schema
 from api_hapag.services.sync_service import (
     sincronizar_disputas_e_invoices,
     atualizar_disputas_antigas
@@ -21,7 +23,16 @@ from api_hapag.services.sync_service import (
 logger = setup_logger()
 
 
-def main():
+def atualizar_disputas(usar_async: bool = False):
+    """Etapa de refresh das disputas antigas: threads (padrão) ou asyncio."""
+    if usar_async:
+        from api_hapag.services.async_refresh_service import atualizar_disputas_antigas_async
+        atualizar_disputas_antigas_async()
+    else:
+        atualizar_disputas_antigas(max_workers=MAX_WORKERS)
+
+
+def main(usar_async: bool = False):
     """
     Fluxo principal OTIMIZADO:
     1. Valida/renova token
@@ -36,6 +47,9 @@ def main():
     logger.info("=" * 60)
 
     try:
+        # Banco precisa estar migrado (content_hash, checked_at e chave única)
+        verificar_schema()
+
         # Etapa 1: Garantir token válido
         logger.info("Etapa 1: Validando token...")
         token = get_valid_token()
@@ -54,7 +68,7 @@ def main():
 
         # Etapa 3: Atualizar disputas antigas
         logger.info("Etapa 3: Atualizando disputas desatualizadas...")
-        atualizar_disputas_antigas(max_workers=5)
+        atualizar_disputas(usar_async)
         logger.info("")
 
         logger.info("=" * 60)
@@ -71,7 +85,7 @@ def main():
         sys.exit(1)
 
 
-def main_quick():
+def main_quick(usar_async: bool = False):
     """
     Modo rápido: apenas atualiza disputas antigas
     Útil para execução frequente (ex: cron a cada hora)
@@ -81,6 +95,8 @@ def main_quick():
     logger.info("=" * 60)
 
     try:
+        verificar_schema()
+
         logger.info("Validando token...")
         token = get_valid_token()
 
@@ -91,7 +107,7 @@ def main_quick():
         logger.info("Token validado")
         logger.info("")
 
-        atualizar_disputas_antigas(max_workers=5)
+        atualizar_disputas(usar_async)
         logger.info("")
 
         logger.info("=" * 60)
@@ -109,13 +125,17 @@ def main_quick():
 
 
 if __name__ == "__main__":
-    if len(sys.argv) > 1:
-        if sys.argv[1] == "--quick":
-            main_quick()
-        else:
-            print("Uso: python main.py [--quick]")
-            print("  (sem argumentos): sincronização completa")
-            print("  --quick: apenas atualiza disputas antigas")
-            sys.exit(1)
+    args = sys.argv[1:]
+    opcoes_validas = {"--quick", "--async"}
+
+    if any(arg not in opcoes_validas for arg in args):
+        print("Uso: python main.py [--quick] [--async]")
+        print("  (sem argumentos): sincronização completa")
+        print("  --quick: apenas atualiza disputas antigas")
+        print("  --async: atualiza disputas antigas com asyncio (centenas de requisições simultâneas)")
+        sys.exit(1)
+
+    if "--quick" in args:
+        main_quick(usar_async="--async" in args)
     else:
-        main()
\ No newline at end of file
+        main(usar_async="--async" in args)
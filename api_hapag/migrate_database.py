@@ -0,0 +1,165 @@
+"""
+migrate_database.py
+Prepara a tabela disputa para a sincronização Hapag:
+- content_hash: impressão digital dos dados gravados (evita UPDATE sem mudança)
+- checked_at: última vez que a disputa foi conferida na API
+- chave única (invoice_id, dispute_number): usada pelo ON DUPLICATE KEY
+  UPDATE de upsert_disputas_batch (sem ela, o upsert duplica linhas)
+Pode ser executado mais de uma vez (só cria o que falta).
+
+Uso: python -m api_hapag.migrate_database
+"""
+
+import sys
+from pathlib import Path
+
+# Adiciona o diretório pai ao path
+parent_dir = Path(__file__).parent.parent
+sys.path.insert(0, str(parent_dir))
+
+from api_hapag.config.db import get_conn
+from api_hapag.utils.logger import setup_logger
+
+logger = setup_logger()
+
+COLUNAS = {
+    "content_hash": "ALTER TABLE disputa ADD COLUMN content_hash CHAR(40) NULL",
+    "checked_at": "ALTER TABLE disputa ADD COLUMN checked_at DATETIME(3) NULL",
+}
+
+INDICE_UNICO = "uq_disputa_invoice_dispute"
+COLUNAS_INDICE_UNICO = ("invoice_id", "dispute_number")
+
+
+def colunas_existentes() -> set:
+    """Retorna as colunas atuais da tabela disputa"""
+    sql = """
+        SELECT COLUMN_NAME FROM information_schema.COLUMNS
+        WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'disputa'
+    """
+    with get_conn() as conn, conn.cursor() as cur:
+        cur.execute(sql)
+        return {row[0] for row in cur.fetchall()}
+
+
+def indice_unico_existe() -> bool:
+    """True se a tabela disputa tem um índice único exatamente em (invoice_id, dispute_number)."""
+    sql = """
+        SELECT INDEX_NAME, GROUP_CONCAT(COLUMN_NAME ORDER BY SEQ_IN_INDEX)
+        FROM information_schema.STATISTICS
+        WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'disputa' AND NON_UNIQUE = 0
+        GROUP BY INDEX_NAME
+    """
+    with get_conn() as conn, conn.cursor() as cur:
+        cur.execute(sql)
+        return any(
+            set(colunas.split(",")) == set(COLUNAS_INDICE_UNICO)
+            for _, colunas in cur.fetchall()
+        )
+
+
+def contar_duplicadas() -> int:
+    """Pares (invoice_id, dispute_number) gravados mais de uma vez (impedem o índice único)."""
+    sql = """
+        SELECT COUNT(*) FROM (
+            SELECT invoice_id, dispute_number
+            FROM disputa
+            WHERE dispute_number IS NOT NULL
+            GROUP BY invoice_id, dispute_number
+            HAVING COUNT(*) > 1
+        ) duplicadas
+    """
+    with get_conn() as conn, conn.cursor() as cur:
+        cur.execute(sql)
+        return cur.fetchone()[0]
+
+
+def adicionar_indice_unico() -> bool:
+    """Cria o índice único se ainda não existir. Retorna True se criou."""
+    if indice_unico_existe():
+        logger.info(f"Índice único ({', '.join(COLUNAS_INDICE_UNICO)}) já existe")
+        return False
+
+    duplicadas = contar_duplicadas()
+    if duplicadas:
+        raise RuntimeError(
+            f"{duplicadas} pares (invoice_id, dispute_number) duplicados na tabela disputa. "
+            "Remova as duplicatas antes de criar o índice único."
+        )
+
+    with get_conn() as conn, conn.cursor() as cur:
+        cur.execute(
+            f"ALTER TABLE disputa ADD UNIQUE KEY {INDICE_UNICO} ({', '.join(COLUNAS_INDICE_UNICO)})"
+        )
+        conn.commit()
+
+    logger.info(f"Índice único {INDICE_UNICO} criado")
+    return True
+
+
+def verificar_schema():
+    """
+    Verifica no início da execução se a migração foi aplicada.
+    Sem as colunas, a sincronização falharia na primeira consulta; sem o
+    índice único, o upsert em lote gravaria disputas duplicadas.
+    """
+    faltando = [coluna for coluna in COLUNAS if coluna not in colunas_existentes()]
+    if not indice_unico_existe():
+        faltando.append(f"índice único ({', '.join(COLUNAS_INDICE_UNICO)})")
+
+    if faltando:
+        raise RuntimeError(
+            f"Tabela disputa sem: {', '.join(faltando)}. "
+            "Execute a migração antes: python -m api_hapag.migrate_database"
+        )
+
+
+def adicionar_colunas() -> int:
+    """Cria as colunas que ainda não existem. Retorna quantas foram criadas."""
+    existentes = colunas_existentes()
+    criadas = 0
+
+    with get_conn() as conn, conn.cursor() as cur:
+        for coluna, ddl in COLUNAS.items():
+            if coluna in existentes:
+                logger.info(f"Coluna {coluna} já existe")
+                continue
+
+            cur.execute(ddl)
+            criadas += 1
+            logger.info(f"Coluna {coluna} criada")
+
+        conn.commit()
+
+    return criadas
+
+
+def main():
+    logger.info("=" * 60)
+    logger.info("MIGRAÇÃO DO BANCO - DETECÇÃO DE MUDANÇA EM DISPUTAS")
+    logger.info("=" * 60)
+
+    criadas = adicionar_colunas()
+    indice_criado = adicionar_indice_unico()
+
+    logger.info("")
+    logger.info("=" * 60)
+    logger.info(
+        f"MIGRAÇÃO CONCLUÍDA ({criadas} colunas criadas"
+        f"{', índice único criado' if indice_criado else ''})"
+    )
+    logger.info("=" * 60)
+
+
+if __name__ == "__main__":
+    try:
+        main()
+    except KeyboardInterrupt:
+        logger.warning("\nOperação cancelada pelo usuário")
+        sys.exit(130)
+    except Exception as e:
+        logger.error(f"Erro na execução: {e}")
+        import traceback
+
+        traceback.print_exc()
+        sys.exit(1)
@@ -1,7 +1,10 @@
 # api_hapag/repos/dispute_repository.py
 
+import hashlib
+import json
+import logging
 from dataclasses import dataclass
-from typing import List, Optional
+from typing import Dict, List, Optional, Tuple
 from datetime import datetime, timedelta
 from api_hapag.config.db import get_conn
 
@@ -18,17 +21,47 @@ class Disputa:
     allow_second_review: Optional[bool] = None
     api_created_date: Optional[datetime] = None
     updated_at: Optional[datetime] = None
+    content_hash: Optional[str] = None
+    checked_at: Optional[datetime] = None
 
 
 # ===== CONSTANTE: Status finais que NÃO devem ser atualizados =====
 STATUS_FINAIS = ['ACCEPTED', 'REJECTED', 'CLOSED', 'CANCELLED']
 
 
+# ===== Detecção de mudança =====
+def calcular_hash_disputa(data: dict) -> str:
+    """
+    Impressão digital (SHA-1) dos campos gravados da disputa normalizada.
+    Se o hash não mudou, a API devolveu os mesmos dados e o UPDATE é dispensado.
+    """
+    campos = (
+        data.get('status'),
+        data.get('dispute_reason'),
+        data.get('amount'),
+        data.get('currency'),
+        data.get('allowSecondReview'),
+        data.get('disputeCreated'),
+    )
+    return hashlib.sha1(json.dumps(campos, default=str).encode("utf-8")).hexdigest()
+
+
+def _marcar_verificadas(cur, ids: List[int]) -> None:
+    """Disputas conferidas sem mudança: só atualiza checked_at."""
+    if ids:
+        cur.execute(
+            "UPDATE disputa SET checked_at = CURRENT_TIMESTAMP(3) WHERE id IN ({})".format(
+                ','.join(['%s'] * len(ids))
+            ),
+            ids
+        )
+
+
 # ===== NOVA FUNÇÃO: Buscar disputas antigas =====
 def get_disputas_para_atualizar() -> List[Disputa]:
     """
     Retorna disputas que precisam ser atualizadas:
-    - updated_at > 2 horas atrás
+    - última verificação (checked_at, ou updated_at) > 2 horas atrás
     - status NÃO está em STATUS_FINAIS
     - invoice é HAPAG
     """
@@ -38,13 +71,14 @@ def get_disputas_para_atualizar() -> List[Disputa]:
         SELECT d.id, d.invoice_id, d.dispute_number, d.status,
                d.dispute_reason, d.disputed_amount, d.currency,
                d.allow_second_review,
-               d.api_created_date, d.updated_at
+               d.api_created_date, d.updated_at,
+               d.content_hash, d.checked_at
         FROM disputa d
         JOIN invoice i ON d.invoice_id = i.id
         WHERE i.armador = 'HAPAG'
-          AND d.updated_at < %s
+          AND COALESCE(d.checked_at, d.updated_at) < %s
           AND d.status NOT IN ({})
-        ORDER BY d.updated_at ASC
+        ORDER BY COALESCE(d.checked_at, d.updated_at) ASC
     """.format(','.join(['%s'] * len(STATUS_FINAIS)))
 
     params = [duas_horas_atras] + STATUS_FINAIS
@@ -108,7 +142,7 @@ def upsert_disputa(invoice_id: int, dispute_number: int, data: dict) -> int:
         ID da disputa inserida/atualizada
     """
     sql_check = """
-        SELECT id, status FROM disputa
+        SELECT id, status, content_hash FROM disputa
         WHERE invoice_id = %s AND dispute_number = %s
         LIMIT 1
     """
@@ -117,21 +151,11 @@ def upsert_disputa(invoice_id: int, dispute_number: int, data: dict) -> int:
         INSERT INTO disputa (
             invoice_id, dispute_number, status, dispute_reason,
             disputed_amount, currency, allow_second_review,
-            api_created_date
-        ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
+            api_created_date, content_hash, checked_at
+        ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, CURRENT_TIMESTAMP(3))
     """
 
-    sql_update = """
-        UPDATE disputa
-        SET status = %s,
-            dispute_reason = %s,
-            disputed_amount = %s,
-            currency = %s,
-            allow_second_review = %s,
-            api_created_date = %s,
-            updated_at = CURRENT_TIMESTAMP
-        WHERE id = %s
-    """
+    content_hash = calcular_hash_disputa(data)
 
     with get_conn() as conn, conn.cursor(dictionary=True) as cur:
         # Verifica se já existe
@@ -139,16 +163,12 @@ def upsert_disputa(invoice_id: int, dispute_number: int, data: dict) -> int:
         row = cur.fetchone()
 
         if row:
-            # Já existe - atualiza
-            cur.execute(sql_update, (
-                data.get('status'),
-                data.get('dispute_reason'),
-                data.get('amount'),
-                data.get('currency'),
-                data.get('allowSecondReview'),
-                data.get('disputeCreated'),
-                row["id"]
-            ))
+            if row["content_hash"] == content_hash:
+                # Nada mudou na API - só registra a verificação
+                _marcar_verificadas(cur, [row["id"]])
+            else:
+                # Já existe e mudou - atualiza
+                cur.execute(SQL_UPDATE_COMPLETA, _valores_update_completa(row["id"], data))
             conn.commit()
             return row["id"]
 
@@ -161,41 +181,234 @@ def upsert_disputa(invoice_id: int, dispute_number: int, data: dict) -> int:
             data.get('amount'),
             data.get('currency'),
             data.get('allowSecondReview'),
-            data.get('disputeCreated')
+            data.get('disputeCreated'),
+            content_hash
         ))
         conn.commit()
         return cur.lastrowid
 
 
+def upsert_disputas_batch(registros: List[tuple], tamanho_lote: int = 500) -> int:
+    """
+    Insere ou atualiza várias disputas de uma vez.
+    INSERT multi-linha com ON DUPLICATE KEY UPDATE, em lotes,
+    tudo dentro de uma única transação (1 conexão, 1 commit).
+    Depende da chave única uq_disputa_invoice_dispute (invoice_id,
+    dispute_number), criada por migrate_database.py.
+    Disputas cujo hash não mudou não são regravadas (só checked_at).
+
+    Se um lote falhar, ele é desfeito (SAVEPOINT) e refeito linha a
+    linha: só as disputas com problema ficam de fora.
+
+    Args:
+        registros: Lista de tuplas (invoice_id, dispute_number, data)
+        tamanho_lote: Número de linhas por INSERT
+
+    Returns:
+        Número de disputas gravadas ou conferidas
+    """
+    if not registros:
+        return 0
+
+    sql_base = """
+        INSERT INTO disputa (
+            invoice_id, dispute_number, status, dispute_reason,
+            disputed_amount, currency, allow_second_review,
+            api_created_date, content_hash, checked_at
+        ) VALUES {valores}
+        ON DUPLICATE KEY UPDATE
+            status = VALUES(status),
+            dispute_reason = VALUES(dispute_reason),
+            disputed_amount = VALUES(disputed_amount),
+            currency = VALUES(currency),
+            allow_second_review = VALUES(allow_second_review),
+            api_created_date = VALUES(api_created_date),
+            content_hash = VALUES(content_hash),
+            checked_at = VALUES(checked_at),
+            updated_at = CURRENT_TIMESTAMP
+    """
+    placeholder = "(%s, %s, %s, %s, %s, %s, %s, %s, %s, CURRENT_TIMESTAMP(3))"
+
+    def gravar(cur, params: List[tuple]):
+        cur.execute(
+            sql_base.format(valores=", ".join([placeholder] * len(params))),
+            [valor for linha in params for valor in linha]
+        )
+
+    gravadas = 0
+
+    with get_conn() as conn, conn.cursor() as cur:
+        try:
+            for i in range(0, len(registros), tamanho_lote):
+                lote = registros[i:i + tamanho_lote]
+                existentes = _hashes_por_chave(cur, [(inv, num) for inv, num, _ in lote])
+
+                params = []
+                inalteradas = []
+                for invoice_id, dispute_number, data in lote:
+                    content_hash = calcular_hash_disputa(data)
+                    existente = existentes.get((invoice_id, dispute_number))
+                    if existente and existente[1] == content_hash:
+                        inalteradas.append(existente[0])
+                        continue
+
+                    params.append((
+                        invoice_id,
+                        dispute_number,
+                        data.get('status'),
+                        data.get('dispute_reason'),
+                        data.get('amount'),
+                        data.get('currency'),
+                        data.get('allowSecondReview'),
+                        data.get('disputeCreated'),
+                        content_hash
+                    ))
+
+                _marcar_verificadas(cur, inalteradas)
+                gravadas += len(inalteradas)
+                if not params:
+                    continue
+
+                cur.execute("SAVEPOINT lote_disputas")
+                try:
+                    gravar(cur, params)
+                    gravadas += len(params)
+                    continue
+                except Exception as e:
+                    cur.execute("ROLLBACK TO SAVEPOINT lote_disputas")
+                    logging.warning(f"Lote de {len(params)} disputas falhou ({e}); gravando linha a linha")
+
+                for linha in params:
+                    cur.execute("SAVEPOINT linha_disputa")
+                    try:
+                        gravar(cur, [linha])
+                        gravadas += 1
+                    except Exception as e:
+                        cur.execute("ROLLBACK TO SAVEPOINT linha_disputa")
+                        logging.error(f"Erro ao gravar disputa {linha[1]} (invoice_id={linha[0]}): {e}")
+
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+
+    return gravadas
+
+
+def _hashes_por_chave(cur, chaves: List[Tuple[int, int]]) -> Dict[Tuple[int, int], Tuple[int, str]]:
+    """(invoice_id, dispute_number) -> (id, content_hash) das disputas já gravadas."""
+    if not chaves:
+        return {}
+
+    sql = """
+        SELECT id, invoice_id, dispute_number, content_hash
+        FROM disputa
+        WHERE (invoice_id, dispute_number) IN ({})
+    """.format(','.join(['(%s, %s)'] * len(chaves)))
+
+    cur.execute(sql, [valor for chave in chaves for valor in chave])
+    return {
+        (invoice_id, dispute_number): (disputa_id, content_hash)
+        for disputa_id, invoice_id, dispute_number, content_hash in cur.fetchall()
+    }
+
+
 # ===== NOVA FUNÇÃO: Atualizar disputa completa =====
-def update_disputa_completa(disputa_id: int, data: dict) -> None:
+SQL_UPDATE_COMPLETA = """
+    UPDATE disputa
+    SET status = %s,
+        dispute_reason = %s,
+        disputed_amount = %s,
+        currency = %s,
+        allow_second_review = %s,
+        api_created_date = %s,
+        content_hash = %s,
+        checked_at = CURRENT_TIMESTAMP(3),
+        updated_at = CURRENT_TIMESTAMP
+    WHERE id = %s
+"""
+
+# Só "toca" a disputa se o conteúdo for o mesmo já gravado
+SQL_MARCAR_SE_INALTERADA = """
+    UPDATE disputa
+    SET checked_at = CURRENT_TIMESTAMP(3)
+    WHERE id = %s AND content_hash = %s
+"""
+
+
+def _valores_update_completa(disputa_id: int, data: dict) -> tuple:
+    return (
+        data.get('status'),
+        data.get('dispute_reason'),
+        data.get('amount'),
+        data.get('currency'),
+        data.get('allowSecondReview'),
+        data.get('disputeCreated'),
+        calcular_hash_disputa(data),
+        disputa_id
+    )
+
+
+def update_disputa_completa(disputa_id: int, data: dict) -> bool:
     """
     Atualiza todos os campos de uma disputa existente.
     Usado quando a disputa já existe e precisa de refresh dos dados da API.
+    Se os dados forem os mesmos já gravados, só atualiza checked_at.
+
+    Returns:
+        True se os dados mudaram e foram regravados
     """
-    sql = """
-        UPDATE disputa
-        SET status = %s,
-            dispute_reason = %s,
-            disputed_amount = %s,
-            currency = %s,
-            allow_second_review = %s,
-            api_created_date = %s,
-            updated_at = CURRENT_TIMESTAMP
-        WHERE id = %s
+    with get_conn() as conn, conn.cursor() as cur:
+        cur.execute(SQL_MARCAR_SE_INALTERADA, (disputa_id, calcular_hash_disputa(data)))
+        alterada = cur.rowcount == 0
+        if alterada:
+            cur.execute(SQL_UPDATE_COMPLETA, _valores_update_completa(disputa_id, data))
+        conn.commit()
+        return alterada
+
+
+def update_disputas_completas_batch(registros: List[tuple]) -> int:
     """
+    Atualiza várias disputas de uma vez (executemany + 1 commit).
+    Usado pelo refresh assíncrono para não gravar disputa por disputa.
+    Disputas cujo hash não mudou só recebem checked_at.
+
+    Args:
+        registros: Lista de tuplas (disputa_id, data)
+
+    Returns:
+        Número de disputas atualizadas ou conferidas
+    """
+    if not registros:
+        return 0
 
     with get_conn() as conn, conn.cursor() as cur:
-        cur.execute(sql, (
-            data.get('status'),
-            data.get('dispute_reason'),
-            data.get('amount'),
-            data.get('currency'),
-            data.get('allowSecondReview'),
-            data.get('disputeCreated'),
-            disputa_id
-        ))
-        conn.commit()
+        try:
+            ids = [disputa_id for disputa_id, _ in registros]
+            cur.execute(
+                "SELECT id, content_hash FROM disputa WHERE id IN ({})".format(','.join(['%s'] * len(ids))),
+                ids
+            )
+            hashes = dict(cur.fetchall())
+
+            inalteradas = []
+            valores = []
+            for disputa_id, data in registros:
+                linha = _valores_update_completa(disputa_id, data)
+                if hashes.get(disputa_id) == linha[-2]:
+                    inalteradas.append(disputa_id)
+                else:
+                    valores.append(linha)
+
+            _marcar_verificadas(cur, inalteradas)
+            if valores:
+                cur.executemany(SQL_UPDATE_COMPLETA, valores)
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+
+    return len(registros)
 
 
 def update_disputa_status(disputa_id: int, status: str) -> None:
@@ -204,7 +417,7 @@ def update_disputa_status(disputa_id: int, status: str) -> None:
     """
     sql = """
         UPDATE disputa
-        SET status = %s, updated_at = CURRENT_TIMESTAMP
+        SET status = %s, content_hash = NULL, updated_at = CURRENT_TIMESTAMP
         WHERE id = %s
     """
     with get_conn() as conn, conn.cursor() as cur:
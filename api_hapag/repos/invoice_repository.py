@@ -1,4 +1,5 @@
 from dataclasses import dataclass
+from datetime import datetime
 from typing import List, Optional
 from api_hapag.config.db import get_conn
 
@@ -7,6 +8,7 @@ from api_hapag.config.db import get_conn
 class Invoice:
     id: int
     numero_invoice: str
+    updated_at: Optional[datetime] = None
 
 
 def list_invoices(limit: Optional[int] = None) -> List[Invoice]:
@@ -21,7 +23,7 @@ def list_invoices(limit: Optional[int] = None) -> List[Invoice]:
     """
     if limit is None:
         sql = """
-            SELECT id, numero_invoice
+            SELECT id, numero_invoice, updated_at
             FROM invoice
             WHERE armador = 'HAPAG'
             ORDER BY id
@@ -29,10 +31,10 @@ def list_invoices(limit: Optional[int] = None) -> List[Invoice]:
         with get_conn() as conn, conn.cursor(dictionary=True) as cur:
             cur.execute(sql)
             rows = cur.fetchall()
-            return [Invoice(id=row["id"], numero_invoice=row["numero_invoice"]) for row in rows]
+            return [Invoice(**row) for row in rows]
     else:
         sql = """
-            SELECT id, numero_invoice
+            SELECT id, numero_invoice, updated_at
             FROM invoice
             WHERE armador = 'HAPAG'
             ORDER BY id
@@ -41,7 +43,7 @@ def list_invoices(limit: Optional[int] = None) -> List[Invoice]:
         with get_conn() as conn, conn.cursor(dictionary=True) as cur:
             cur.execute(sql, (limit,))
             rows = cur.fetchall()
-            return [Invoice(id=row["id"], numero_invoice=row["numero_invoice"]) for row in rows]
+            return [Invoice(**row) for row in rows]
 
 
 def get_invoice_by_id(invoice_id: int) -> Optional[Invoice]:
@@ -0,0 +1,235 @@
+"""
+async_refresh_service.py
+Atualização de disputas antigas com asyncio (aiohttp).
+Mantém centenas de consultas em andamento com uma única thread
+e grava os resultados no banco em lotes.
+"""
+
+import asyncio
+import logging
+from typing import List, Tuple
+
+import aiohttp
+
+from api_hapag.repos.dispute_repository import (
+    Disputa,
+    get_disputas_para_atualizar,
+    update_disputas_completas_batch,
+    STATUS_FINAIS
+)
+from api_hapag.services.dispute_service import normalizar_detalhe_disputa
+from api_hapag.services.token_service import renovar_token
+from api_hapag.utils.storage import get_cached_token
+
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s [%(levelname)s] %(message)s"
+)
+
+API_DISPUTES_URL = "https://dispute-overview.api.hlag.cloud/api/disputes"
+
+MAX_CONCORRENCIA = 100  # Requisições simultâneas em andamento
+TAMANHO_LOTE = 200      # Disputas por gravação no banco
+
+
+async def _renovar_token(auth: dict, token_recusado: str) -> bool:
+    """
+    Renova o token compartilhado após um 401 (login em outra thread).
+    Só a primeira tarefa que recebe 401 renova; as demais esperam o lock
+    e reutilizam o token novo. Se a renovação falhar, não tenta de novo.
+    """
+    async with auth["lock"]:
+        if auth["headers"]["x-token"] != token_recusado:
+            return True  # outra tarefa já renovou
+
+        if auth["falhou"]:
+            return False
+
+        novo = await asyncio.to_thread(renovar_token, token_recusado)
+        if not novo:
+            auth["falhou"] = True
+            logging.error("Não foi possível renovar o token")
+            return False
+
+        auth["headers"] = {**auth["headers"], "Authorization": f"Bearer {novo}", "x-token": novo}
+        return True
+
+
+async def _consultar_disputa(
+        session: aiohttp.ClientSession,
+        semaforo: asyncio.Semaphore,
+        auth: dict,
+        dispute_number: int,
+        max_tentativas: int = 3
+) -> dict | None:
+    """
+    Versão assíncrona de consultar_disputa, com o mesmo retry/backoff
+    de fazer_requisicao_com_retry (inclusive a renovação do token em 401).
+    O semáforo só é ocupado durante a requisição, não durante o backoff.
+    """
+    url = f"{API_DISPUTES_URL}/{dispute_number}"
+    token_renovado = False
+    tentativa = 0
+
+    while tentativa < max_tentativas:
+        tentativa += 1
+        headers = auth["headers"]
+        try:
+            async with semaforo:
+                async with session.get(url, headers=headers) as r:
+                    if r.status == 200:
+                        data = await r.json(content_type=None)
+                        return normalizar_detalhe_disputa(data, dispute_number)
+
+                    if r.status == 404:
+                        logging.warning(f"Disputa {dispute_number} não encontrada")
+                        return None
+
+                    if r.status == 401:
+                        if token_renovado:
+                            logging.error(f"Disputa {dispute_number}: token inválido (401) mesmo após renovação")
+                            return None
+
+                        token_renovado = True
+                        if not await _renovar_token(auth, headers["x-token"]):
+                            return None
+
+                        tentativa -= 1  # a renovação não consome tentativa
+                        continue
+
+                    logging.warning(
+                        f"Disputa {dispute_number}: tentativa {tentativa}/{max_tentativas} falhou: {r.status}"
+                    )
+
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            logging.error(
+                f"Disputa {dispute_number}: erro na requisição "
+                f"(tentativa {tentativa}/{max_tentativas}): {e!r}"
+            )
+
+        if tentativa < max_tentativas:
+            await asyncio.sleep(2 ** tentativa)
+
+    logging.error(f"Disputa {dispute_number}: todas as {max_tentativas} tentativas falharam")
+    return None
+
+
+async def _consultar(
+        session: aiohttp.ClientSession,
+        semaforo: asyncio.Semaphore,
+        auth: dict,
+        disp: Disputa
+) -> Tuple[Disputa, dict | None]:
+    return disp, await _consultar_disputa(session, semaforo, auth, disp.dispute_number)
+
+
+async def _gravar_lote(lote: List[tuple], gravacao: asyncio.Lock) -> int:
+    """
+    Grava um lote no banco em outra thread, sem bloquear o event loop.
+    Os lotes são gravados um de cada vez (`gravacao`) para não ocupar várias
+    conexões do pool (config/db.py) com threads paradas na espera.
+    """
+    try:
+        async with gravacao:
+            return await asyncio.to_thread(update_disputas_completas_batch, lote)
+    except Exception as e:
+        logging.error(f"Erro ao gravar lote de {len(lote)} disputas: {e}")
+        return 0
+
+
+async def _executar(disputas: List[Disputa], token: str, max_concorrencia: int, tamanho_lote: int) -> dict:
+    # Token compartilhado pelas tarefas (trocado em caso de 401)
+    auth = {
+        "headers": {
+            "Authorization": f"Bearer {token}",
+            "x-token": token,
+            "Accept": "application/json"
+        },
+        "lock": asyncio.Lock(),
+        "falhou": False
+    }
+
+    semaforo = asyncio.Semaphore(max_concorrencia)
+    connector = aiohttp.TCPConnector(limit=max_concorrencia)
+    timeout = aiohttp.ClientTimeout(total=20)
+
+    stats = {"consultadas": 0, "atualizadas": 0, "erros": 0}
+    pendentes: List[tuple] = []
+    gravacoes = []
+    gravacao = asyncio.Lock()
+
+    async with aiohttp.ClientSession(connector=connector, timeout=timeout) as session:
+        tarefas = [
+            asyncio.create_task(_consultar(session, semaforo, auth, disp))
+            for disp in disputas
+        ]
+
+        for tarefa in asyncio.as_completed(tarefas):
+            disp, data = await tarefa
+            stats["consultadas"] += 1
+
+            if not data:
+                logging.error(f"Não foi possível consultar disputa {disp.dispute_number}")
+                stats["erros"] += 1
+                continue
+
+            pendentes.append((disp.id, data))
+
+            if len(pendentes) >= tamanho_lote:
+                # Grava em background enquanto as consultas continuam
+                gravacoes.append(asyncio.create_task(_gravar_lote(pendentes, gravacao)))
+                pendentes = []
+
+            if stats["consultadas"] % 500 == 0:
+                logging.info(f"Progresso: {stats['consultadas']}/{len(disputas)} disputas consultadas")
+
+    if pendentes:
+        gravacoes.append(asyncio.create_task(_gravar_lote(pendentes, gravacao)))
+
+    gravadas = sum(await asyncio.gather(*gravacoes))
+    enviadas = stats["consultadas"] - stats["erros"]
+
+    stats["atualizadas"] = gravadas
+    stats["erros"] += enviadas - gravadas
+
+    return stats
+
+
+def atualizar_disputas_antigas_async(
+        max_concorrencia: int = MAX_CONCORRENCIA,
+        tamanho_lote: int = TAMANHO_LOTE
+):
+    """
+    Atualiza disputas antigas (>2h e não finalizadas) com asyncio.
+    Mesmo resultado de atualizar_disputas_antigas, mas com até
+    `max_concorrencia` consultas simultâneas em uma única thread.
+    """
+    logging.info("Buscando disputas desatualizadas...")
+
+    disputas = get_disputas_para_atualizar()
+    total = len(disputas)
+
+    if total == 0:
+        logging.info("Nenhuma disputa precisa ser atualizada")
+        return
+
+    token = get_cached_token()
+    if not token:
+        logging.error("Token não encontrado")
+        return
+
+    logging.info(f"Total de {total} disputas precisam ser atualizadas")
+    logging.info(f"  (Status finais ignorados: {', '.join(STATUS_FINAIS)})")
+    logging.info(f"Modo assíncrono: até {max_concorrencia} requisições simultâneas, lotes de {tamanho_lote}")
+    logging.info("")
+
+    stats = asyncio.run(_executar(disputas, token, max_concorrencia, tamanho_lote))
+
+    logging.info("")
+    logging.info("=" * 60)
+    logging.info("Atualização concluída:")
+    logging.info(f"  - {total} disputas processadas")
+    logging.info(f"  - {stats['atualizadas']} atualizadas com sucesso")
+    if stats["erros"] > 0:
+        logging.info(f"  - {stats['erros']} erros")
+    logging.info("=" * 60)
@@ -8,14 +8,15 @@ import logging
 import requests
 import time
 from typing import Optional
-from api_hapag.services.token_service import get_valid_token
+from api_hapag.services.token_service import get_valid_token, renovar_token
 from api_hapag.repos.dispute_repository import update_disputa_completa
+from api_hapag.config.http import get_session
 
 logging.basicConfig(
     level=logging.INFO,
     format="%(asctime)s [%(levelname)s] %(message)s"
 )
-from api_hapag.utils.storage import load_token
+from api_hapag.utils.storage import get_cached_token
 from api_hapag.repos.dispute_repository import upsert_disputa
 import uuid
 
@@ -35,21 +36,38 @@ def fazer_requisicao_com_retry(url: str, headers: dict, max_tentativas: int = 3,
     Returns:
         Response ou None se todas as tentativas falharem
     """
-    for tentativa in range(1, max_tentativas + 1):
+    session = get_session()
+    token_renovado = False
+    tentativa = 0
+
+    while tentativa < max_tentativas:
+        tentativa += 1
         try:
             if metodo == "POST":
-                r = requests.post(url, headers=headers, json=payload, timeout=20)
+                r = session.post(url, headers=headers, json=payload, timeout=20)
             else:
-                r = requests.get(url, headers=headers, timeout=20)
+                r = session.get(url, headers=headers, timeout=20)
 
             # Se for 200 ou 404, retorna (não precisa retry)
             if r.status_code in [200, 404]:
                 return r
 
-            # Se for 401 (token inválido), não adianta retry
+            # Se for 401 (token inválido), renova o token UMA vez e repete
             if r.status_code == 401:
-                logging.error(f"Token inválido (401). Renovação necessária.")
-                return None
+                if token_renovado:
+                    logging.error("Token inválido (401) mesmo após renovação.")
+                    return None
+
+                logging.warning("Token inválido (401). Renovando...")
+                token_renovado = True
+                new_token = renovar_token(headers.get("x-token"))
+                if not new_token:
+                    logging.error("Não foi possível renovar o token")
+                    return None
+
+                headers = {**headers, "Authorization": f"Bearer {new_token}", "x-token": new_token}
+                tentativa -= 1  # a renovação não consome tentativa
+                continue
 
             # Para outros erros, tenta novamente
             logging.warning(f"Tentativa {tentativa}/{max_tentativas} falhou: {r.status_code}")
@@ -80,7 +98,7 @@ def consultar_disputa(dispute_number: int) -> dict | None:
         Dicionário com dados normalizados da disputa ou None se erro
     """
 
-    token = load_token()
+    token = get_cached_token()
 
     if not token:
         logging.error("Token não encontrado")
@@ -99,27 +117,8 @@ def consultar_disputa(dispute_number: int) -> dict | None:
         return None
 
     if r.status_code == 200:
-        data = r.json()
         logging.info(f"Disputa {dispute_number} consultada com sucesso")
-
-        # Valida se tem status (campo obrigatório)
-        status = data.get('status') or data.get('disputeStatus') or data.get('currentStatus')
-        if not status:
-            logging.warning(f"Disputa {dispute_number}: status não encontrado na API")
-            return None
-
-        # Normaliza campos da API para o formato do banco
-        return {
-            'status': status,
-            'dispute_reason': data.get('dispute_reason') or data.get('disputeReason'),
-            'amount': data.get('amount') or data.get('disputedAmount'),
-            'currency': data.get('currency'),
-            'ref': data.get('ref') or data.get('reference'),
-            'allowSecondReview': data.get('allowSecondReview'),
-            'disputeCreated': data.get('disputeCreated') or data.get('createdDate'),
-            'invoiceNumber': data.get('invoiceNumber'),
-            'disputeNumber': data.get('disputeNumber') or dispute_number
-        }
+        return normalizar_detalhe_disputa(r.json(), dispute_number)
     elif r.status_code == 404:
         logging.warning(f"Disputa {dispute_number} não encontrada")
         return None
@@ -128,6 +127,29 @@ def consultar_disputa(dispute_number: int) -> dict | None:
         return None
 
 
+def normalizar_detalhe_disputa(data: dict, dispute_number: int) -> dict | None:
+    """
+    Normaliza a resposta de /disputes/{dispute_number} para o formato do banco.
+    Retorna None se a API não informar o status (campo obrigatório).
+    """
+    status = data.get('status') or data.get('disputeStatus') or data.get('currentStatus')
+    if not status:
+        logging.warning(f"Disputa {dispute_number}: status não encontrado na API")
+        return None
+
+    return {
+        'status': status,
+        'dispute_reason': data.get('dispute_reason') or data.get('disputeReason'),
+        'amount': data.get('amount') or data.get('disputedAmount'),
+        'currency': data.get('currency'),
+        'ref': data.get('ref') or data.get('reference'),
+        'allowSecondReview': data.get('allowSecondReview'),
+        'disputeCreated': data.get('disputeCreated') or data.get('createdDate'),
+        'invoiceNumber': data.get('invoiceNumber'),
+        'disputeNumber': data.get('disputeNumber') or dispute_number
+    }
+
+
 def consultar_invoice(invoice_number: str) -> list | None:
     """
     Consulta disputas relacionadas a uma invoice.
@@ -141,7 +163,7 @@ def consultar_invoice(invoice_number: str) -> list | None:
         Lista de dicionários com dados das disputas
     """
 
-    token = load_token()
+    token = get_cached_token()
 
     if not token:
         logging.error("Token não encontrado")
@@ -289,7 +311,7 @@ def enviar_disputa_hapag(
     }
 
     # Valida token
-    token = load_token()
+    token = get_cached_token()
     if not token:
         logging.error("Token não encontrado")
         return None
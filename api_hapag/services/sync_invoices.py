@@ -8,9 +8,10 @@ import sys
 import logging
 import requests
 from datetime import datetime, timedelta
-from typing import Optional, Set
-from api_hapag.services.token_service import get_valid_token
+from typing import Dict, Optional, Set
+from api_hapag.services.token_service import get_valid_token, renovar_token
 from api_hapag.config.db import get_conn
+from api_hapag.config.http import get_session
 from api_hapag.utils.logger import setup_logger
 
 logger = setup_logger()
@@ -58,14 +59,17 @@ def needs_full_sync() -> bool:
 
 # ===== BUSCA NA API =====
 
-def buscar_invoices_api() -> list | None:
+def buscar_invoices_api(token: str | None = None) -> list | None:
     """
     Busca todas as invoices da API Hapag
 
+    Args:
+        token: Token já validado (opcional; se ausente, usa get_valid_token)
+
     Returns:
         Lista de invoices ou None se erro
     """
-    token = get_valid_token()
+    token = token or get_valid_token()
     if not token:
         logger.error("Não foi possível obter token válido")
         return None
@@ -79,7 +83,15 @@ def buscar_invoices_api() -> list | None:
 
     try:
         logger.info("Consultando API de invoices...")
-        r = requests.get(url, headers=headers, timeout=30)
+        r = get_session().get(url, headers=headers, timeout=30)
+
+        if r.status_code == 401:
+            # Token recusado: renova UMA vez e repete
+            logger.warning("Token inválido (401). Renovando...")
+            token = renovar_token(token)
+            if token:
+                headers = {**headers, "Authorization": f"Bearer {token}", "x-token": token}
+                r = get_session().get(url, headers=headers, timeout=30)
 
         if r.status_code == 200:
             data = r.json()
@@ -95,6 +107,14 @@ def buscar_invoices_api() -> list | None:
         return None
 
 
+def indexar_invoices(invoices: list) -> Dict[str, dict]:
+    """
+    Indexa a lista da API por invoiceNumber (catálogo da execução).
+    Lookup O(1) ao invés de varrer a lista inteira a cada invoice.
+    """
+    return {str(inv.get('invoiceNumber')): inv for inv in invoices}
+
+
 # ===== OPERAÇÕES EM LOTE (OTIMIZADO) =====
 
 def get_invoices_existentes_set() -> Set[str]:
@@ -321,7 +341,7 @@ def atualizar_invoices_batch(invoices_data: list, batch_size: int = 100) -> int:
 
 # ===== FUNÇÃO PRINCIPAL OTIMIZADA =====
 
-def sincronizar_invoices():
+def sincronizar_invoices(catalogo: Dict[str, dict] | None = None):
     """
     Sincroniza invoices da API com o banco de dados.
 
@@ -330,13 +350,20 @@ def sincronizar_invoices():
     - Processamento em lote: insere/atualiza 100 registros por vez ao invés de 1
 
     GANHO DE PERFORMANCE: ~80% mais rápido que o método original
+
+    Args:
+        catalogo: Catálogo já baixado nesta execução (ver indexar_invoices).
+                  Se informado, não consulta a API novamente.
     """
     logger.info("=" * 60)
     logger.info("SINCRONIZAÇÃO DE INVOICES - HAPAG-LLOYD")
     logger.info("=" * 60)
 
-    # Busca invoices da API
-    invoices_api = buscar_invoices_api()
+    # Busca invoices da API (ou reutiliza o catálogo da execução)
+    if catalogo is not None:
+        invoices_api = list(catalogo.values())
+    else:
+        invoices_api = buscar_invoices_api()
 
     if not invoices_api:
         logger.error("Não foi possível buscar invoices da API")
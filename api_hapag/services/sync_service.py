@@ -9,26 +9,31 @@ import requests
 from typing import Optional, Dict, List
 from datetime import datetime, timedelta
 from concurrent.futures import ThreadPoolExecutor, as_completed
-from api_hapag.repos.invoice_repository import list_invoices
+from api_hapag.repos.invoice_repository import Invoice, list_invoices
 from api_hapag.repos.dispute_repository import (
-    upsert_disputa,
+    upsert_disputas_batch,
     get_disputas_para_atualizar,
     STATUS_FINAIS
 )
-from api_hapag.utils.storage import load_token
+from api_hapag.services.sync_invoices import buscar_invoices_api, indexar_invoices
+from api_hapag.utils.storage import get_cached_token
+from api_hapag.services.token_service import renovar_token
 from api_hapag.config.db import get_conn
+from api_hapag.config.http import get_session, MAX_WORKERS
 
 logging.basicConfig(
     level=logging.INFO,
     format="%(asctime)s [%(levelname)s] %(message)s"
 )
 
+MAX_TENTATIVAS_CATALOGO = 3  # downloads do catálogo de invoices por execução
+
 
 def buscar_todas_disputas_api() -> List[dict] | None:
     """
     Busca TODAS as disputas de uma vez da API.
     """
-    token = load_token()
+    token = get_cached_token()
     if not token:
         logging.error("Token não encontrado")
         return None
@@ -42,7 +47,15 @@ def buscar_todas_disputas_api() -> List[dict] | None:
 
     try:
         logging.info("Buscando todas as disputas da API...")
-        r = requests.get(url, headers=headers, timeout=30)
+        r = get_session().get(url, headers=headers, timeout=30)
+
+        if r.status_code == 401:
+            # Token recusado: renova UMA vez e repete
+            logging.warning("Token inválido (401). Renovando...")
+            token = renovar_token(token)
+            if token:
+                headers = {**headers, "Authorization": f"Bearer {token}", "x-token": token}
+                r = get_session().get(url, headers=headers, timeout=30)
 
         if r.status_code == 200:
             data = r.json()
@@ -63,44 +76,42 @@ def buscar_todas_disputas_api() -> List[dict] | None:
         return None
 
 
-def buscar_invoice_da_api(invoice_number: str) -> dict | None:
+def buscar_catalogo_invoices_api() -> Dict[str, dict] | None:
     """
-    Busca UMA invoice específica da API Hapag.
-    Usado apenas quando a invoice não existe no banco mas tem disputa.
+    Baixa a lista de invoices da API UMA vez e indexa por invoiceNumber.
+    O catálogo é compartilhado por toda a execução da sincronização.
     """
-    token = load_token()
+    token = get_cached_token()
     if not token:
         logging.error("Token não encontrado")
         return None
 
-    url = "https://invoice-overview.api.hlag.cloud/api/invoices"
-    headers = {
-        "Authorization": f"Bearer {token}",
-        "x-token": token,
-        "Accept": "application/json"
-    }
+    invoices = buscar_invoices_api(token)
+    if invoices is None:
+        return None
 
-    try:
-        r = requests.get(url, headers=headers, timeout=30)
+    return indexar_invoices(invoices)
 
-        if r.status_code == 200:
-            data = r.json()
-            invoices = data.get('invoiceList', [])
 
-            # Procura a invoice específica
-            for inv in invoices:
-                if str(inv.get('invoiceNumber')) == str(invoice_number):
-                    return inv
+def buscar_invoice_da_api(invoice_number: str, catalogo: Dict[str, dict] | None = None) -> dict | None:
+    """
+    Busca UMA invoice específica da API Hapag.
+    Usado apenas quando a invoice não existe no banco mas tem disputa.
 
-            logging.warning(f"Invoice {invoice_number} não encontrada na API")
-            return None
-        else:
-            logging.error(f"Erro {r.status_code}: {r.text}")
+    Args:
+        invoice_number: Número da invoice
+        catalogo: Catálogo da execução (buscar_catalogo_invoices_api).
+                  Se ausente, baixa a lista da API só para esta consulta.
+    """
+    if catalogo is None:
+        catalogo = buscar_catalogo_invoices_api()
+        if catalogo is None:
             return None
 
-    except requests.RequestException as e:
-        logging.error(f"Erro na requisição: {e}")
-        return None
+    inv = catalogo.get(str(invoice_number))
+    if not inv:
+        logging.warning(f"Invoice {invoice_number} não encontrada na API")
+    return inv
 
 
 def inserir_invoice_no_banco(invoice_data: dict) -> int | None:
@@ -210,7 +221,7 @@ def sincronizar_disputas_e_invoices():
        - Se NÃO existe: busca da API de invoices e cria
        - Se existe E passou >2h: atualiza dados
        - Se existe E <2h: pula (não precisa atualizar)
-    3. Salva as disputas
+    3. Salva as disputas (em lote, uma única transação)
 
     RESULTADO: Sincroniza apenas 8-11 invoices ao invés de 604
     """
@@ -236,7 +247,8 @@ def sincronizar_disputas_e_invoices():
     # 3. Carrega invoices do banco para verificar quais existem
     logging.info("Carregando invoices do banco...")
     todas_invoices_banco = list_invoices(limit=None)
-    invoice_map = {inv.numero_invoice: inv.id for inv in todas_invoices_banco}
+    # numero_invoice -> Invoice (já traz updated_at: decisão de frescor 100% em memória)
+    invoice_map = {inv.numero_invoice: inv for inv in todas_invoices_banco}
 
     # 4. Processa cada invoice com disputa
     invoices_processadas = 0
@@ -244,10 +256,33 @@ def sincronizar_disputas_e_invoices():
     invoices_atualizadas = 0
     invoices_puladas = 0
     disputas_salvas = 0
+    disputas_para_salvar = []
     erros = 0
 
     duas_horas_atras = datetime.now() - timedelta(hours=2)
 
+    # Catálogo de invoices da API: baixado sob demanda, 1 vez por execução.
+    # None = ainda não baixado ou download falhou (tenta de novo, até o limite)
+    catalogo_invoices = None
+    tentativas_catalogo = 0
+
+    def invoice_da_api(numero: str) -> dict | None:
+        nonlocal catalogo_invoices, tentativas_catalogo
+        if catalogo_invoices is None and tentativas_catalogo < MAX_TENTATIVAS_CATALOGO:
+            tentativas_catalogo += 1
+            catalogo_invoices = buscar_catalogo_invoices_api()
+            if catalogo_invoices is None:
+                logging.error(
+                    f"  Falha ao baixar o catálogo de invoices da API "
+                    f"(tentativa {tentativas_catalogo}/{MAX_TENTATIVAS_CATALOGO})"
+                )
+
+        if catalogo_invoices is None:
+            logging.error(f"  Invoice {numero}: catálogo de invoices da API indisponível")
+            return None
+
+        return buscar_invoice_da_api(numero, catalogo_invoices)
+
     for invoice_number, disputas in disputas_por_invoice.items():
         invoices_processadas += 1
         logging.info(
@@ -256,19 +291,22 @@ def sincronizar_disputas_e_invoices():
         )
 
         # Verifica se invoice existe no banco
-        invoice_id = invoice_map.get(invoice_number)
+        invoice = invoice_map.get(invoice_number)
+        invoice_id = invoice.id if invoice else None
 
-        if not invoice_id:
+        if not invoice:
             # Invoice NÃO existe - buscar da API e criar
             logging.info(f"  Invoice {invoice_number} não existe no banco, buscando da API...")
 
-            invoice_data = buscar_invoice_da_api(invoice_number)
+            invoice_data = invoice_da_api(invoice_number)
 
             if invoice_data:
                 invoice_id = inserir_invoice_no_banco(invoice_data)
                 if invoice_id:
                     invoices_criadas += 1
-                    invoice_map[invoice_number] = invoice_id
+                    invoice_map[invoice_number] = Invoice(
+                        id=invoice_id, numero_invoice=invoice_number, updated_at=datetime.now()
+                    )
                     logging.info(f"  Invoice {invoice_number} criada no banco (id={invoice_id})")
                 else:
                     logging.error(f"  Erro ao criar invoice {invoice_number}")
@@ -280,41 +318,24 @@ def sincronizar_disputas_e_invoices():
                 continue
         else:
             # Invoice JÁ existe - verificar se precisa atualizar (>2h)
-            sql_check = "SELECT updated_at FROM invoice WHERE id = %s"
-            try:
-                with get_conn() as conn, conn.cursor(dictionary=True) as cur:
-                    cur.execute(sql_check, (invoice_id,))
-                    row = cur.fetchone()
-
-                    if row and row['updated_at']:
-                        ultima_atualizacao = row['updated_at']
-
-                        # Se foi atualizada há menos de 2 horas, PULA
-                        if ultima_atualizacao >= duas_horas_atras:
-                            invoices_puladas += 1
-                            logging.info(
-                                f"  Invoice {invoice_number} atualizada recentemente "
-                                f"({ultima_atualizacao}), pulando"
-                            )
-                        else:
-                            # Precisa atualizar (>2h)
-                            invoice_data = buscar_invoice_da_api(invoice_number)
-                            if invoice_data:
-                                if atualizar_invoice_no_banco(invoice_id, invoice_data):
-                                    invoices_atualizadas += 1
-                                    logging.info(f"  Invoice {invoice_number} atualizada (id={invoice_id})")
-                    else:
-                        # Sem updated_at, atualiza por segurança
-                        invoice_data = buscar_invoice_da_api(invoice_number)
-                        if invoice_data:
-                            if atualizar_invoice_no_banco(invoice_id, invoice_data):
-                                invoices_atualizadas += 1
-                                logging.info(f"  Invoice {invoice_number} atualizada (id={invoice_id})")
-            except Exception as e:
-                logging.error(f"  Erro ao verificar updated_at: {e}")
-                invoices_puladas += 1
+            ultima_atualizacao = invoice.updated_at
 
-        # Salva as disputas da invoice
+            # Se foi atualizada há menos de 2 horas, PULA
+            if ultima_atualizacao and ultima_atualizacao >= duas_horas_atras:
+                invoices_puladas += 1
+                logging.info(
+                    f"  Invoice {invoice_number} atualizada recentemente "
+                    f"({ultima_atualizacao}), pulando"
+                )
+            else:
+                # Precisa atualizar (>2h ou sem updated_at, por segurança)
+                invoice_data = invoice_da_api(invoice_number)
+                if invoice_data:
+                    if atualizar_invoice_no_banco(invoice_id, invoice_data):
+                        invoices_atualizadas += 1
+                        logging.info(f"  Invoice {invoice_number} atualizada (id={invoice_id})")
+
+        # Acumula as disputas da invoice para gravar em lote no final
         for disputa in disputas:
             dispute_no = disputa.get('disputeNumber')
             status = disputa.get('status')
@@ -323,21 +344,17 @@ def sincronizar_disputas_e_invoices():
                 logging.warning(f"  Disputa {dispute_no} sem status, ignorando")
                 continue
 
-            try:
-                disputa_normalizada = normalizar_disputa(disputa)
+            disputas_para_salvar.append((invoice_id, dispute_no, normalizar_disputa(disputa)))
 
-                saved_id = upsert_disputa(
-                    invoice_id=invoice_id,
-                    dispute_number=dispute_no,
-                    data=disputa_normalizada
-                )
-
-                disputas_salvas += 1
-                logging.info(f"    Disputa {dispute_no} sincronizada (status={status}, id={saved_id})")
-
-            except Exception as e:
-                logging.error(f"    Erro ao salvar disputa {dispute_no}: {e}")
-                erros += 1
+    # 5. Salva todas as disputas em lote (poucos INSERTs, 1 commit)
+    if disputas_para_salvar:
+        logging.info(f"Gravando {len(disputas_para_salvar)} disputas em lote...")
+        try:
+            disputas_salvas = upsert_disputas_batch(disputas_para_salvar)
+            erros += len(disputas_para_salvar) - disputas_salvas
+        except Exception as e:
+            logging.error(f"Erro ao salvar disputas em lote: {e}")
+            erros += len(disputas_para_salvar)
 
     # Resumo
     logging.info("")
@@ -354,7 +371,7 @@ def sincronizar_disputas_e_invoices():
     logging.info("=" * 60)
 
 
-def atualizar_disputas_antigas(max_workers: int = 5):
+def atualizar_disputas_antigas(max_workers: int = MAX_WORKERS):
     """
     Atualiza apenas disputas que precisam de refresh COM PARALELIZAÇÃO.
     """
@@ -3,9 +3,13 @@ token.py
 Gerencia o ciclo de vida do XToken.
 """
 
+import time
 import requests
 import logging
-from api_hapag.utils.storage import load_token, save_token
+import threading
+import jwt
+from api_hapag.utils.storage import load_token, save_token, get_cached_token
+from api_hapag.config.http import get_session
 from api_hapag.services.auth_service import login_and_get_token  # função que você já tem no auth.py
 
 logging.basicConfig(
@@ -13,6 +17,14 @@ logging.basicConfig(
     format="%(asctime)s [%(levelname)s] %(message)s"
 )
 
+# Garante um único login em andamento: threads que encontram o token
+# expirado ao mesmo tempo esperam o login da primeira em vez de abrir
+# um navegador cada uma.
+_renovacao_lock = threading.Lock()
+
+# Folga (segundos) antes do `exp`: token que expira nesse intervalo já é renovado
+MARGEM_EXPIRACAO = 300
+
 
 def test_token(token: str) -> bool:
     """Verifica se o token ainda é válido chamando a API /disputes"""
@@ -23,39 +35,92 @@ def test_token(token: str) -> bool:
         "Accept": "application/json"
     }
     try:
-        r = requests.get(url, headers=headers, timeout=10)
+        r = get_session().get(url, headers=headers, timeout=10)
         return r.status_code == 200
     except requests.RequestException:
         return False
 
 
+def expiracao_token(token: str) -> float | None:
+    """Lê o claim `exp` do JWT, sem validar assinatura. None se não houver."""
+    try:
+        return jwt.decode(token, options={"verify_signature": False}).get("exp")
+    except jwt.PyJWTError:
+        return None
+
+
+def token_valido(token: str) -> bool:
+    """
+    Valida o token localmente pelo `exp` do JWT, exigindo uma folga de
+    MARGEM_EXPIRACAO segundos. Só consulta a API (test_token) se o token
+    não tiver `exp`.
+    """
+    exp = expiracao_token(token)
+    if exp is None:
+        logging.info("Token sem 'exp', validando na API...")
+        return test_token(token)
+
+    restante = exp - time.time()
+    if restante > MARGEM_EXPIRACAO:
+        logging.info(f"Token expira em {restante / 60:.0f} min")
+        return True
+
+    logging.warning("Token expirado ou perto de expirar")
+    return False
+
+
 def get_valid_token() -> str | None:
     """
     Fluxo completo:
     1. Carrega token salvo
-    2. Testa token
+    2. Valida token (pelo `exp` do JWT; API só se não houver `exp`)
     3. Se inválido → gera novo via login
     4. Salva no arquivo
     5. Retorna token válido
     """
-    token = load_token()
+    token = get_cached_token()
     if token:
         logging.info("Token carregado do arquivo. Testando...")
-        if test_token(token):
+        if token_valido(token):
             logging.info("Token ainda valido")
             return token
         else:
             logging.warning("Token expirado, gerando novo...")
 
-    # Se não tinha ou expirou → gera novo
-    new_token = login_and_get_token()
+    new_token = renovar_token(token)
     if new_token:
-        save_token(new_token)
-        logging.info("Novo token salvo em xtoken.txt")
         return new_token
 
     logging.error("Nao foi possivel obter token valido")
     return None
 
+
+def renovar_token(token_recusado: str | None) -> str | None:
+    """
+    Gera um novo token via login, a menos que outra thread já tenha
+    trocado o token recusado (expirado ou com 401) por um válido.
+
+    Args:
+        token_recusado: Token que o chamador estava usando quando falhou
+
+    Returns:
+        Token novo ou None se o login falhar
+    """
+    with _renovacao_lock:
+        # Outra thread pode ter renovado enquanto esperávamos o lock
+        atual = load_token()
+        if atual and atual != token_recusado and token_valido(atual):
+            logging.info("Token já renovado por outra thread")
+            return atual
+
+        # Se não tinha, expirou ou foi recusado → gera novo
+        new_token = login_and_get_token()
+        if new_token:
+            save_token(new_token)
+            logging.info("Novo token salvo em xtoken.txt")
+            return new_token
+
+    return None
+
 if __name__ == '__main__':
     get_valid_token()
\ No newline at end of file
@@ -0,0 +1,57 @@
+"""
+test_dispute_hash.py
+Testa a impressão digital (calcular_hash_disputa) usada para pular UPDATEs sem mudança
+"""
+
+from datetime import datetime
+from decimal import Decimal
+
+from api_hapag.repos.dispute_repository import calcular_hash_disputa
+
+DISPUTA = {
+    'status': 'IN_PROGRESS',
+    'dispute_reason': 'D16',
+    'amount': 150.5,
+    'currency': 'USD',
+    'allowSecondReview': False,
+    'disputeCreated': '2024-03-10T14:30:15Z',
+    'invoiceNumber': '123456',
+    'disputeNumber': 987,
+}
+
+
+def test_mesmos_dados_mesmo_hash():
+    assert calcular_hash_disputa(DISPUTA) == calcular_hash_disputa(dict(DISPUTA))
+
+
+def test_formato_sha1():
+    content_hash = calcular_hash_disputa(DISPUTA)
+    assert len(content_hash) == 40  # cabe na coluna CHAR(40)
+    int(content_hash, 16)
+
+
+def test_campo_gravado_alterado_muda_o_hash():
+    for campo, valor in [
+        ('status', 'ACCEPTED'),
+        ('dispute_reason', 'D17'),
+        ('amount', 151),
+        ('currency', 'EUR'),
+        ('allowSecondReview', True),
+        ('disputeCreated', '2024-03-11T00:00:00Z'),
+    ]:
+        assert calcular_hash_disputa({**DISPUTA, campo: valor}) != calcular_hash_disputa(DISPUTA), campo
+
+
+def test_campos_nao_gravados_nao_mudam_o_hash():
+    outra = {**DISPUTA, 'invoiceNumber': '999', 'disputeNumber': 1, 'ref': 'x@y.com'}
+    assert calcular_hash_disputa(outra) == calcular_hash_disputa(DISPUTA)
+
+
+def test_campo_ausente_igual_a_none():
+    sem_moeda = {k: v for k, v in DISPUTA.items() if k != 'currency'}
+    assert calcular_hash_disputa(sem_moeda) == calcular_hash_disputa({**DISPUTA, 'currency': None})
+
+
+def test_tipos_nao_json_serializaveis():
+    data = {**DISPUTA, 'amount': Decimal('150.50'), 'disputeCreated': datetime(2024, 3, 10, 14, 30, 15)}
+    assert len(calcular_hash_disputa(data)) == 40
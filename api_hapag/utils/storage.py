@@ -4,6 +4,7 @@ Gerencia leitura e escrita de cookies e tokens.
 """
 
 import json
+import threading
 from pathlib import Path
 
 ARTIFACTS_DIR = Path("artifacts")
@@ -24,8 +25,15 @@ def load_cookies() -> list | None:
     return None
 
 
+# Token em memória, compartilhado pelo processo. Relido do disco só quando
+# o xtoken.txt muda (mtime) ou após invalidate_token_cache (ex.: save_token).
+_token_lock = threading.Lock()
+_token_cache = {"mtime": None, "token": None}
+
+
 def save_token(token: str):
     XTOKEN_FILE.write_text(token, encoding="utf-8")
+    invalidate_token_cache()
 
 
 def load_token() -> str | None:
@@ -34,3 +42,27 @@ def load_token() -> str | None:
         if token.startswith("eyJ") and len(token) > 50:
             return token
     return None
+
+
+def get_cached_token() -> str | None:
+    """
+    Mesmo resultado de load_token(), mas lê o arquivo uma única vez
+    enquanto ele não for alterado.
+    """
+    try:
+        mtime = XTOKEN_FILE.stat().st_mtime_ns
+    except FileNotFoundError:
+        return None
+
+    with _token_lock:
+        if _token_cache["mtime"] != mtime:
+            _token_cache["token"] = load_token()
+            _token_cache["mtime"] = mtime
+        return _token_cache["token"]
+
+
+def invalidate_token_cache():
+    """Descarta o token em memória (ex.: após 401); a próxima leitura vai ao disco."""
+    with _token_lock:
+        _token_cache["mtime"] = None
+        _token_cache["token"] = None
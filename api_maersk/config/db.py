@@ -0,0 +1,40 @@
+import threading
+from contextlib import contextmanager
+from mysql.connector import pooling
+
+from api_maersk.config.settings import DB_HOST, DB_PORT, DB_NAME, DB_USER, DB_PASSWORD, DB_POOL_SIZE
+
+_pool = None
+_pool_lock = threading.Lock()
+
+# MySQLConnectionPool lança PoolError quando todas as conexões estão em uso.
+# O semáforo faz as threads do sync paralelo esperarem por uma conexão livre.
+_slots = threading.BoundedSemaphore(DB_POOL_SIZE)
+
+
+def _get_pool() -> pooling.MySQLConnectionPool:
+    """Cria o pool na primeira utilização (evita abrir conexões no import)."""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = pooling.MySQLConnectionPool(
+                    pool_name="maersk_pool",
+                    pool_size=DB_POOL_SIZE,
+                    host=DB_HOST,
+                    port=DB_PORT,
+                    database=DB_NAME,
+                    user=DB_USER,
+                    password=DB_PASSWORD,
+                )
+    return _pool
+
+
+@contextmanager
+def get_conn():
+    with _slots:
+        conn = _get_pool().get_connection()
+        try:
+            yield conn
+        finally:
+            conn.close()
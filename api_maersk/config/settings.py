@@ -12,6 +12,7 @@ ARTIFACTS_DIR.mkdir(exist_ok=True)
 
 # Arquivos
 TOKENS_FILE = ARTIFACTS_DIR / "maersk_all_tokens.json"
+INVOICE_TYPE_STATS_FILE = ARTIFACTS_DIR / "invoice_type_stats.json"  # acertos de invoiceType por cliente
 
 # Credenciais Maersk
 MAERSK_USERNAME = os.getenv("MAERSK_USERNAME")
@@ -35,6 +36,22 @@ CUSTOMER_CODE_MAPPING = {
     "30501113841": "BR01113841",
 }
 
+# Rate limit da API Maersk (token bucket adaptativo por host/consumer-key) e paralelismo
+API_RATE_LIMIT = float(os.getenv("MAERSK_API_RATE", "4"))    # requisições/segundo (inicial)
+API_RATE_BURST = float(os.getenv("MAERSK_API_BURST", "4"))   # rajada máxima
+API_RATE_MIN = float(os.getenv("MAERSK_API_RATE_MIN", "0.5"))   # piso após 429/5xx
+API_RATE_MAX = float(os.getenv("MAERSK_API_RATE_MAX", "10"))    # teto com respostas saudáveis
+API_RETRY_ATTEMPTS = int(os.getenv("MAERSK_API_RETRIES", "3"))     # tentativas por requisição
+API_RETRY_BASE_DELAY = float(os.getenv("MAERSK_API_RETRY_DELAY", "1"))  # backoff inicial (s)
+OUTDATED_MAX_WORKERS = int(os.getenv("MAERSK_OUTDATED_WORKERS", "4"))  # por cliente
+CUSTOMER_MAX_WORKERS = int(os.getenv("MAERSK_CUSTOMER_WORKERS", "5"))   # clientes simultâneos (--concurrent)
+DISPUTE_PAGE_WORKERS = int(os.getenv("MAERSK_PAGE_WORKERS", "3"))       # páginas de disputas em paralelo
+INVOICES_MAX_URL_LENGTH = 2000  # limite da URL do GET /invoices com vários ids
+
+# Renovação antecipada de tokens: antes de cada execução, se algum token
+# expira dentro desta janela, todos são renovados numa única sessão do browser
+TOKEN_REFRESH_WINDOW_MINUTES = int(os.getenv("MAERSK_TOKEN_REFRESH_WINDOW", "30"))
+
 # Selenium
 SELENIUM_TIMEOUT = 30
 PAGE_LOAD_WAIT = 3
@@ -47,6 +64,7 @@ DB_PORT = int(os.getenv("DB_PORT", "3306"))
 DB_NAME = os.getenv("DB_NAME")
 DB_USER = os.getenv("DB_USER")
 DB_PASSWORD = os.getenv("DB_PASSWORD")
+DB_POOL_SIZE = int(os.getenv("MAERSK_DB_POOL_SIZE", "10"))  # máx. 32 (limite do mysql-connector)
 
 # Validação: garante que credenciais críticas estão configuradas
 if not DB_PASSWORD:
@@ -4,19 +4,24 @@ Ponto de entrada principal da aplicacao
 """
 import sys
 import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
 
 sys.path.insert(0, str(Path(__file__).parent.parent))
 
 from api_maersk.services.token_service import TokenService
 from api_maersk.services.auth_service import AuthService
-from api_maersk.services.dispute_service import DisputeService
+from api_maersk.services.dispute_service import DisputeService, DisputeListingError, shared_rate_limiter
 from api_maersk.services.dispute_sync_service import DisputeSyncService
 
 from api_maersk.services.dispute_sync_service_parallel import DisputeSyncServiceParallel
+from api_maersk.services.dispute_snapshot import DisputeSnapshot
+from api_maersk.services.invoice_type_probe import InvoiceTypeProbe
 from api_maersk.repos.invoice_repository import InvoiceRepository
 from api_maersk.repos.disputa_repository import DisputaRepository
-from api_maersk.config.settings import CUSTOMER_CODE_MAPPING
+from api_maersk.config.settings import (
+    CUSTOMER_CODE_MAPPING, OUTDATED_MAX_WORKERS, CUSTOMER_MAX_WORKERS
+)
 from api_maersk.utils.logger import setup_logger
 from api_maersk.scripts.import_missing_invoices import (
     get_missing_invoices_from_disputes,
@@ -27,10 +32,15 @@ logger = setup_logger(__name__)
 
 
 def create_services():
-    """Inicializa todos os servicos necessarios."""
+    """
+    Inicializa todos os servicos necessarios.
+    O rate limiter e unico: todas as chamadas a API (de todos os clientes)
+    consomem do mesmo orcamento de requisicoes.
+    """
+    rate_limiter = shared_rate_limiter()
     token_service = TokenService()
     auth_service = AuthService(token_service)
-    dispute_service = DisputeService(token_service, auth_service)
+    dispute_service = DisputeService(token_service, auth_service, rate_limiter=rate_limiter)
     invoice_repo = InvoiceRepository()
     disputa_repo = DisputaRepository()
 
@@ -39,56 +49,101 @@ def create_services():
         'invoice_repo': invoice_repo,
         'disputa_repo': disputa_repo,
         'sync': DisputeSyncService(dispute_service, invoice_repo, disputa_repo),
-        'sync_parallel': DisputeSyncServiceParallel(dispute_service, invoice_repo, disputa_repo, max_workers=3)
+        'sync_parallel': DisputeSyncServiceParallel(dispute_service, invoice_repo, disputa_repo, max_workers=3),
+        'type_probe': InvoiceTypeProbe(dispute_service),
+        'rate_limiter': rate_limiter,
+        'token': token_service,
+        'auth': auth_service
     }
 
 
-def import_missing_invoices(customer_code: str) -> int:
+def import_missing_invoices(customer_code: str, services: dict, snapshot: DisputeSnapshot = None) -> int:
     """Importa invoices que tem disputa mas nao estao no banco."""
-    missing = get_missing_invoices_from_disputes(customer_code)
+    missing = get_missing_invoices_from_disputes(
+        customer_code, dispute_service=services['dispute'], snapshot=snapshot
+    )
     if not missing:
         return 0
 
-    stats = fetch_and_insert_missing_invoices(customer_code, missing)
+    stats = fetch_and_insert_missing_invoices(
+        customer_code, missing, dispute_service=services['dispute'], type_probe=services['type_probe']
+    )
     return stats.get('inseridas_banco', 0)
 
 
-def update_outdated_disputes(customer_code: str, services: dict) -> int:
-    """Atualiza disputas desatualizadas (>2h, status nao final)."""
+def update_outdated_disputes(
+        customer_code: str,
+        services: dict,
+        snapshot: DisputeSnapshot = None,
+        max_workers: int = OUTDATED_MAX_WORKERS
+) -> int:
+    """
+    Atualiza disputas desatualizadas (>2h, status nao final) em paralelo.
+    Ate `max_workers` threads por cliente; o ritmo de chamadas a API e
+    controlado pelo rate limiter compartilhado do DisputeService.
+    Com `snapshot`, o cache de invoices e carregado so com as invoices em disputa.
+    """
     disputas = services['disputa_repo'].get_outdated(customer_code)
     if not disputas:
         return 0
 
-    logger.info(f"Atualizando {len(disputas)} disputas desatualizadas...")
+    logger.info(f"Atualizando {len(disputas)} disputas desatualizadas ({max_workers} threads)...")
+    if snapshot is not None:
+        services['sync'].preload_invoice_ids_for(snapshot.invoice_numbers)
+    else:
+        services['sync'].preload_invoice_ids(customer_code)
     updated = 0
 
-    for disputa in disputas:
-        dispute_id = str(disputa['dispute_number'])
-        try:
-            result = services['sync'].update_dispute_status(dispute_id, customer_code)
-            if result.get('success'):
-                updated += 1
-            time.sleep(0.5)
-        except Exception as e:
-            logger.error(f"Erro ao atualizar {dispute_id}: {e}")
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {
+            executor.submit(
+                services['sync'].update_dispute_status, str(disputa['dispute_number']), customer_code
+            ): str(disputa['dispute_number'])
+            for disputa in disputas
+        }
+
+        for future in as_completed(futures):
+            try:
+                if future.result().get('success'):
+                    updated += 1
+            except Exception as e:
+                logger.error(f"Erro ao atualizar {futures[future]}: {e}")
 
     return updated
 
 
-def process_customer(customer_code: str, services: dict) -> dict:
-    """Processa um cliente: importa invoices, sincroniza e atualiza disputas."""
-    # Passo 1: Importar invoices faltantes
-    logger.info(f"[1/3] Importando invoices faltantes...")
-    invoices = import_missing_invoices(customer_code)
-
-    # Passo 2: Sincronizar disputas
-    logger.info(f"[2/3] Sincronizando disputas...")
-    stats = services['sync_parallel'].sync_disputes_parallel(customer_code, limit=10000)
-    synced = stats.get('disputas_salvas', 0) if 'erro' not in stats else 0
+def process_customer(customer_code: str, services: dict, incremental: bool = False) -> dict:
+    """
+    Processa um cliente: importa invoices, sincroniza e atualiza disputas.
+    As disputas sao listadas UMA vez (snapshot) e reaproveitadas pelos 3 passos.
+    Se a listagem ficar incompleta, os passos 1 e 2 (que dependem da lista
+    completa) sao pulados; o passo 3 roda normalmente.
+    Com `incremental=True` (--incremental), o passo 2 so consulta disputas
+    novas ou com lastModifiedDate alterado.
+    """
+    logger.info(f"[{customer_code}] Listando disputas da API...")
+    try:
+        snapshot = DisputeSnapshot.fetch(services['dispute'], customer_code)
+    except DisputeListingError as e:
+        logger.error(f"[{customer_code}] {e}; importacao e sincronizacao puladas")
+        snapshot = None
+
+    invoices, synced, stats = 0, 0, {}
+    if snapshot is not None:
+        # Passo 1: Importar invoices faltantes
+        logger.info(f"[{customer_code}] [1/3] Importando invoices faltantes...")
+        invoices = import_missing_invoices(customer_code, services, snapshot)
+
+        # Passo 2: Sincronizar disputas
+        logger.info(f"[{customer_code}] [2/3] Sincronizando disputas...")
+        stats = services['sync_parallel'].sync_disputes_parallel(
+            customer_code, limit=10000, snapshot=snapshot, incremental=incremental
+        )
+        synced = stats.get('disputas_salvas', 0) if 'erro' not in stats else 0
 
     # Passo 3: Atualizar disputas desatualizadas
-    logger.info(f"[3/3] Atualizando disputas desatualizadas...")
-    updated = update_outdated_disputes(customer_code, services)
+    logger.info(f"[{customer_code}] [3/3] Atualizando disputas desatualizadas...")
+    updated = update_outdated_disputes(customer_code, services, snapshot)
 
     return {
         'invoices': invoices,
@@ -98,35 +153,71 @@ def process_customer(customer_code: str, services: dict) -> dict:
     }
 
 
-def main():
-    logger.info("=" * 60)
-    logger.info("EXECUCAO AUTOMATICA - API MAERSK")
-    logger.info("=" * 60)
+def _accumulate(totals: dict, customer: str, result: dict) -> None:
+    totals['invoices'] += result['invoices']
+    totals['synced'] += result['synced']
+    totals['updated'] += result['updated']
 
-    services = create_services()
-    clientes = list(CUSTOMER_CODE_MAPPING.keys())
+    logger.info(f"[{customer}] Resultado: {result['invoices']} importadas, "
+               f"{result['synced']} sincronizadas, {result['updated']} atualizadas")
 
-    totals = {'invoices': 0, 'synced': 0, 'updated': 0}
-    start = time.time()
 
+def run_sequential(clientes: list, services: dict, totals: dict, incremental: bool = False) -> None:
+    """Processa um cliente por vez."""
     for idx, customer in enumerate(clientes, 1):
         logger.info(f"\nCliente {idx}/{len(clientes)}: {customer}")
 
         try:
-            result = process_customer(customer, services)
+            result = process_customer(customer, services, incremental)
+            _accumulate(totals, customer, result)
 
-            totals['invoices'] += result['invoices']
-            totals['synced'] += result['synced']
-            totals['updated'] += result['updated']
+        except Exception as e:
+            logger.error(f"Erro ao processar {customer}: {e}")
 
-            logger.info(f"Resultado: {result['invoices']} importadas, "
-                       f"{result['synced']} sincronizadas, {result['updated']} atualizadas")
 
-            if idx < len(clientes):
-                time.sleep(5)
+def run_concurrent(
+        clientes: list,
+        services: dict,
+        totals: dict,
+        max_workers: int = CUSTOMER_MAX_WORKERS,
+        incremental: bool = False
+) -> None:
+    """
+    Processa os clientes ao mesmo tempo (cada um com seu token/customer-code).
+    O orcamento de requisicoes continua global: todos compartilham o rate limiter.
+    """
+    logger.info(f"Processando {len(clientes)} clientes em paralelo ({max_workers} simultaneos)")
 
-        except Exception as e:
-            logger.error(f"Erro ao processar {customer}: {e}")
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {executor.submit(process_customer, customer, services, incremental): customer for customer in clientes}
+
+        for future in as_completed(futures):
+            customer = futures[future]
+            try:
+                _accumulate(totals, customer, future.result())
+            except Exception as e:
+                logger.error(f"Erro ao processar {customer}: {e}")
+
+
+def main(concurrent: bool = False, incremental: bool = False):
+    logger.info("=" * 60)
+    logger.info("EXECUCAO AUTOMATICA - API MAERSK")
+    logger.info("=" * 60)
+
+    services = create_services()
+    clientes = list(CUSTOMER_CODE_MAPPING.keys())
+
+    # Renova antes de começar os tokens que expirariam durante a execução
+    if not services['token'].ensure_fresh_tokens(services['auth']):
+        logger.warning("Renovacao antecipada de tokens falhou; seguindo com os tokens atuais")
+
+    totals = {'invoices': 0, 'synced': 0, 'updated': 0}
+    start = time.time()
+
+    if concurrent:
+        run_concurrent(clientes, services, totals, incremental=incremental)
+    else:
+        run_sequential(clientes, services, totals, incremental)
 
     elapsed = time.time() - start
 
@@ -140,7 +231,10 @@ def main():
 
 if __name__ == "__main__":
     try:
-        main()
+        main(
+            concurrent="--concurrent" in sys.argv[1:],
+            incremental="--incremental" in sys.argv[1:]
+        )
     except KeyboardInterrupt:
         logger.info("\nPrograma interrompido pelo usuario")
         sys.exit(0)
@@ -1,18 +1,27 @@
-import mysql.connector
-from api_maersk.config.settings import DB_HOST, DB_PORT, DB_NAME, DB_USER, DB_PASSWORD
+from typing import Dict, List, Optional
+from api_maersk.config.db import get_conn
 from api_maersk.utils.logger import setup_logger
 
 logger = setup_logger(__name__)
 
-
-def _conn():
-    return mysql.connector.connect(
-        host=DB_HOST,
-        port=DB_PORT,
-        database=DB_NAME,
-        user=DB_USER,
-        password=DB_PASSWORD
-    )
+# Colunas gravadas por insert_or_update / insert_or_update_many (mesma ordem)
+DISPUTA_COLUMNS = (
+    "invoice_id",
+    "dispute_number",
+    "status",
+    "disputed_amount",
+    "currency",
+    "reason_code",
+    "reason_description",
+    "dispute_type",
+    "invoice_due_date",
+    "agent_name",
+    "agent_email",
+    "status_code",
+    "api_created_date",
+    "api_last_modified",
+    "customer_code",
+)
 
 
 class DisputaRepository:
@@ -29,11 +38,65 @@ class DisputaRepository:
           AND d.updated_at < NOW() - INTERVAL 2 HOUR
           AND d.status NOT IN ('Accepted - Invoice cancellation and rebill', 'REJECTED', 'CLOSED', 'CANCELLED')
         """
-        with _conn() as conn:
+        with get_conn() as conn:
             cur = conn.cursor(dictionary=True)
             cur.execute(sql, (customer_code,))
             return cur.fetchall()
 
+    def get_last_modified_map(self, customer_code: str) -> Dict[int, object]:
+        """
+        Mapa dispute_number -> api_last_modified das disputas MAERSK do cliente
+        (1 query). Usado pelo sync incremental para saber o que mudou na API.
+        """
+        sql = """
+        SELECT d.dispute_number, d.api_last_modified
+        FROM disputa d
+        JOIN invoice i ON d.invoice_id = i.id
+        WHERE i.armador = 'MAERSK'
+          AND i.customer_code = %s
+        """
+        with get_conn() as conn:
+            cur = conn.cursor()
+            cur.execute(sql, (customer_code,))
+            return {int(number): last_modified for number, last_modified in cur.fetchall()}
+
+    def touch_many(self, dispute_numbers: List[int], customer_code: str, chunk_size: int = 500) -> int:
+        """
+        Marca disputas MAERSK do cliente como verificadas agora (updated_at),
+        sem alterar dados. Disputas sem mudança na API não voltam como
+        "desatualizadas" no get_outdated.
+
+        Filtra por armador/cliente: a tabela disputa também guarda disputas
+        Hapag, que podem ter o mesmo dispute_number.
+        """
+        if not dispute_numbers:
+            return 0
+
+        touched = 0
+        with get_conn() as conn:
+            cur = conn.cursor()
+            try:
+                for i in range(0, len(dispute_numbers), chunk_size):
+                    chunk = dispute_numbers[i:i + chunk_size]
+                    cur.execute(
+                        f"""
+                        UPDATE disputa d
+                        JOIN invoice i ON d.invoice_id = i.id
+                        SET d.updated_at = CURRENT_TIMESTAMP(3)
+                        WHERE i.armador = 'MAERSK'
+                          AND i.customer_code = %s
+                          AND d.dispute_number IN ({', '.join(['%s'] * len(chunk))})
+                        """,
+                        [customer_code, *chunk]
+                    )
+                    touched += cur.rowcount
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+
+        return touched
+
     def insert_or_update(
             self,
             invoice_id: int,
@@ -91,7 +154,7 @@ class DisputaRepository:
           updated_at = CURRENT_TIMESTAMP(3);
         """
 
-        with _conn() as conn:
+        with get_conn() as conn:
             cur = conn.cursor()
             cur.execute(sql, (
                 invoice_id,
@@ -116,4 +179,72 @@ class DisputaRepository:
                 f"Disputa {dispute_number} salva/atualizada para invoice_id={invoice_id} | "
                 f"Status: {status} | Valor: {currency} {disputed_amount} | "
                 f"Motivo: {reason_description}"
-            )
\ No newline at end of file
+            )
+
+    def insert_or_update_many(self, rows: List[Dict], chunk_size: int = 200) -> Dict[int, Optional[str]]:
+        """
+        Insere ou atualiza várias disputas com INSERT multi-linha
+        (ON DUPLICATE KEY UPDATE), em lotes, numa única transação.
+
+        Se um lote falhar, ele é desfeito (SAVEPOINT) e refeito linha a
+        linha, para que só as disputas com problema fiquem de fora e cada
+        erro seja reportado.
+
+        Args:
+            rows: Dicts com as chaves de DISPUTA_COLUMNS (ausentes = NULL)
+            chunk_size: Linhas por INSERT
+
+        Returns:
+            {dispute_number: None (ok) ou mensagem de erro}
+        """
+        results = {}
+        if not rows:
+            return results
+
+        updates = [col for col in DISPUTA_COLUMNS if col not in ("invoice_id", "dispute_number")]
+        placeholder = "(" + ", ".join(["%s"] * len(DISPUTA_COLUMNS)) + ")"
+        update_clause = ",\n          ".join(f"{col} = VALUES({col})" for col in updates)
+
+        def insert_sql(count: int) -> str:
+            return f"""
+            INSERT INTO disputa ({", ".join(DISPUTA_COLUMNS)})
+            VALUES {", ".join([placeholder] * count)}
+            ON DUPLICATE KEY UPDATE
+              {update_clause},
+              updated_at = CURRENT_TIMESTAMP(3);
+            """
+
+        with get_conn() as conn:
+            cur = conn.cursor()
+            try:
+                for i in range(0, len(rows), chunk_size):
+                    chunk = rows[i:i + chunk_size]
+
+                    cur.execute("SAVEPOINT lote_disputas")
+                    try:
+                        params = [row.get(col) for row in chunk for col in DISPUTA_COLUMNS]
+                        cur.execute(insert_sql(len(chunk)), params)
+                        results.update({row.get("dispute_number"): None for row in chunk})
+                        continue
+                    except Exception as e:
+                        cur.execute("ROLLBACK TO SAVEPOINT lote_disputas")
+                        logger.warning(f"Lote de {len(chunk)} disputas falhou ({e}); gravando linha a linha")
+
+                    for row in chunk:
+                        cur.execute("SAVEPOINT linha_disputa")
+                        try:
+                            cur.execute(insert_sql(1), [row.get(col) for col in DISPUTA_COLUMNS])
+                            results[row.get("dispute_number")] = None
+                        except Exception as e:
+                            cur.execute("ROLLBACK TO SAVEPOINT linha_disputa")
+                            logger.error(f"Erro ao gravar disputa {row.get('dispute_number')}: {e}")
+                            results[row.get("dispute_number")] = str(e)
+
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+
+        saved = sum(1 for error in results.values() if error is None)
+        logger.info(f"{saved}/{len(rows)} disputas salvas/atualizadas em lote")
+        return results
@@ -1,16 +1,5 @@
-import mysql.connector
-from typing import List, Dict
-from api_maersk.config.settings import DB_HOST, DB_PORT, DB_NAME, DB_USER, DB_PASSWORD
-
-
-def _conn():
-    return mysql.connector.connect(
-        host=DB_HOST,
-        port=DB_PORT,
-        database=DB_NAME,
-        user=DB_USER,
-        password=DB_PASSWORD
-    )
+from typing import List, Dict, Optional
+from api_maersk.config.db import get_conn
 
 
 class InvoiceRepository:
@@ -24,7 +13,7 @@ class InvoiceRepository:
         WHERE armador = 'MAERSK'
         LIMIT %s
         """
-        with _conn() as conn:
+        with get_conn() as conn:
             cur = conn.cursor(dictionary=True)
             cur.execute(sql, (limit,))
             return cur.fetchall()
@@ -40,7 +29,70 @@ class InvoiceRepository:
         AND customer_code = %s
         LIMIT %s
         """
-        with _conn() as conn:
+        with get_conn() as conn:
             cur = conn.cursor(dictionary=True)
             cur.execute(sql, (customer_code, limit))
-            return cur.fetchall()
\ No newline at end of file
+            return cur.fetchall()
+
+    def get_invoice_id_by_number(self, numero_invoice: str) -> Optional[int]:
+        """
+        Busca o id de uma invoice MAERSK pelo número (lookup direto).
+        """
+        sql = """
+        SELECT id
+        FROM invoice
+        WHERE armador = 'MAERSK'
+        AND numero_invoice = %s
+        LIMIT 1
+        """
+        with get_conn() as conn:
+            cur = conn.cursor(dictionary=True)
+            cur.execute(sql, (numero_invoice,))
+            row = cur.fetchone()
+            return row["id"] if row else None
+
+    def get_invoice_ids_by_numbers(
+            self, numeros: List[str], chunk_size: int = 500, customer_code: Optional[str] = None
+    ) -> Dict[str, int]:
+        """
+        Busca ids de várias invoices MAERSK de uma vez (WHERE numero_invoice IN (...)).
+        Com `customer_code`, considera só as invoices desse cliente.
+
+        Returns:
+            Dict numero_invoice -> id (números inexistentes ficam de fora)
+        """
+        numeros = list(dict.fromkeys(n for n in numeros if n))
+        customer_filter = "AND customer_code = %s" if customer_code else ""
+        result = {}
+
+        with get_conn() as conn:
+            cur = conn.cursor(dictionary=True)
+            for i in range(0, len(numeros), chunk_size):
+                chunk = numeros[i:i + chunk_size]
+                sql = f"""
+                SELECT id, numero_invoice
+                FROM invoice
+                WHERE armador = 'MAERSK'
+                AND numero_invoice IN ({", ".join(["%s"] * len(chunk))})
+                {customer_filter}
+                """
+                cur.execute(sql, chunk + [customer_code] if customer_code else chunk)
+                for row in cur.fetchall():
+                    result[row["numero_invoice"]] = row["id"]
+
+        return result
+
+    def fetch_invoice_id_map(self, customer_code: str) -> Dict[str, int]:
+        """
+        Mapa numero_invoice -> id de todas as invoices de um cliente (sem LIMIT).
+        """
+        sql = """
+        SELECT id, numero_invoice
+        FROM invoice
+        WHERE armador = 'MAERSK'
+        AND customer_code = %s
+        """
+        with get_conn() as conn:
+            cur = conn.cursor(dictionary=True)
+            cur.execute(sql, (customer_code,))
+            return {row["numero_invoice"]: row["id"] for row in cur.fetchall()}
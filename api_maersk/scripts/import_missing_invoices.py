@@ -6,10 +6,11 @@ sys.path.insert(0, str(Path(__file__).parent.parent))
 from api_maersk.services.token_service import TokenService
 from api_maersk.services.auth_service import AuthService
 from api_maersk.services.dispute_service import DisputeService
+from api_maersk.services.dispute_snapshot import DisputeSnapshot
+from api_maersk.services.invoice_type_probe import InvoiceTypeProbe
 from api_maersk.repos.invoice_repository import InvoiceRepository
 from api_maersk.utils.logger import setup_logger
-import mysql.connector
-from api_maersk.config.settings import DB_HOST, DB_PORT, DB_NAME, DB_USER, DB_PASSWORD
+from api_maersk.config.db import get_conn
 import time
 
 from datetime import datetime
@@ -42,13 +43,42 @@ def convert_microsoft_date(date_string: str) -> str:
         return None
 
 
-def _conn():
-    return mysql.connector.connect(
-        host=DB_HOST,
-        port=DB_PORT,
-        database=DB_NAME,
-        user=DB_USER,
-        password=DB_PASSWORD
+INVOICE_INSERT_COLUMNS = (
+    "numero_invoice", "armador", "customer_code", "customer_name",
+    "data_emissao_invoice", "valor", "moeda", "status",
+)
+
+INVOICE_UPDATE_CLAUSE = """
+        ON DUPLICATE KEY UPDATE
+            data_emissao_invoice = VALUES(data_emissao_invoice),
+            valor = VALUES(valor),
+            moeda = VALUES(moeda),
+            status = VALUES(status),
+            customer_code = VALUES(customer_code),
+            customer_name = VALUES(customer_name),
+            updated_at = NOW(3)
+"""
+
+
+def _invoice_params(invoice_data: dict) -> tuple:
+    return (
+        invoice_data.get("numero_invoice"),
+        invoice_data.get("armador", "MAERSK"),
+        invoice_data.get("customer_code"),
+        invoice_data.get("customer_name"),
+        invoice_data.get("data_emissao_invoice"),
+        invoice_data.get("valor"),
+        invoice_data.get("moeda"),
+        invoice_data.get("status")
+    )
+
+
+def _insert_invoices_sql(count: int) -> str:
+    placeholder = "(" + ", ".join(["%s"] * len(INVOICE_INSERT_COLUMNS)) + ", NOW(3))"
+    return (
+        f"INSERT INTO invoice ({', '.join(INVOICE_INSERT_COLUMNS)}, updated_at)\n"
+        f"        VALUES {', '.join([placeholder] * count)}"
+        f"{INVOICE_UPDATE_CLAUSE}"
     )
 
 
@@ -63,31 +93,9 @@ def insert_invoice_into_db(invoice_data: dict) -> bool:
         True se inseriu com sucesso, False caso contrário
     """
     try:
-        sql = """
-        INSERT INTO invoice (numero_invoice, armador, customer_code, customer_name, data_emissao_invoice, valor, moeda, status, updated_at)
-        VALUES (%s, %s, %s, %s, %s, %s, %s, %s, NOW(3))
-        ON DUPLICATE KEY UPDATE
-            data_emissao_invoice = VALUES(data_emissao_invoice),
-            valor = VALUES(valor),
-            moeda = VALUES(moeda),
-            status = VALUES(status),
-            customer_code = VALUES(customer_code),
-            customer_name = VALUES(customer_name),
-            updated_at = NOW(3)
-        """
-
-        with _conn() as conn:
+        with get_conn() as conn:
             cur = conn.cursor()
-            cur.execute(sql, (
-                invoice_data.get("numero_invoice"),
-                invoice_data.get("armador", "MAERSK"),
-                invoice_data.get("customer_code"),
-                invoice_data.get("customer_name"),
-                invoice_data.get("data_emissao_invoice"),
-                invoice_data.get("valor"),
-                invoice_data.get("moeda"),
-                invoice_data.get("status")
-            ))
+            cur.execute(_insert_invoices_sql(1), _invoice_params(invoice_data))
             conn.commit()
             logger.info(
                 f"Invoice {invoice_data['numero_invoice']} inserida no banco ({invoice_data['customer_code']})")
@@ -98,13 +106,82 @@ def insert_invoice_into_db(invoice_data: dict) -> bool:
         return False
 
 
-def fetch_and_insert_missing_invoices(customer_code: str, invoice_numbers: list) -> dict:
+def insert_invoices_into_db(invoices: list, chunk_size: int = 200) -> dict:
+    """
+    Insere várias invoices no banco com INSERT multi-linha
+    (ON DUPLICATE KEY UPDATE), em lotes, numa única conexão/transação.
+
+    Se um lote falhar, ele é desfeito (SAVEPOINT) e refeito linha a
+    linha, para que só as invoices com problema fiquem de fora e cada
+    erro seja reportado.
+
+    Args:
+        invoices: Dicts no formato de insert_invoice_into_db
+        chunk_size: Linhas por INSERT
+
+    Returns:
+        {numero_invoice: None (ok) ou mensagem de erro}
+    """
+    results = {}
+    if not invoices:
+        return results
+
+    with get_conn() as conn:
+        cur = conn.cursor()
+        try:
+            for i in range(0, len(invoices), chunk_size):
+                chunk = invoices[i:i + chunk_size]
+
+                cur.execute("SAVEPOINT lote_invoices")
+                try:
+                    params = [value for inv in chunk for value in _invoice_params(inv)]
+                    cur.execute(_insert_invoices_sql(len(chunk)), params)
+                    results.update({inv.get("numero_invoice"): None for inv in chunk})
+                    continue
+                except Exception as e:
+                    cur.execute("ROLLBACK TO SAVEPOINT lote_invoices")
+                    logger.warning(f"Lote de {len(chunk)} invoices falhou ({e}); inserindo linha a linha")
+
+                for inv in chunk:
+                    cur.execute("SAVEPOINT linha_invoice")
+                    try:
+                        cur.execute(_insert_invoices_sql(1), _invoice_params(inv))
+                        results[inv.get("numero_invoice")] = None
+                    except Exception as e:
+                        cur.execute("ROLLBACK TO SAVEPOINT linha_invoice")
+                        logger.error(f"Erro ao inserir invoice {inv.get('numero_invoice')}: {e}")
+                        results[inv.get("numero_invoice")] = str(e)
+
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+
+    inserted = sum(1 for error in results.values() if error is None)
+    logger.info(f"{inserted}/{len(invoices)} invoices inseridas/atualizadas em lote")
+    return results
+
+
+def _default_dispute_service() -> DisputeService:
+    token_service = TokenService()
+    auth_service = AuthService(token_service)
+    return DisputeService(token_service, auth_service)
+
+
+def fetch_and_insert_missing_invoices(
+        customer_code: str,
+        invoice_numbers: list,
+        dispute_service: DisputeService = None,
+        type_probe: InvoiceTypeProbe = None
+) -> dict:
     """
     Busca invoices na API e insere no banco de dados.
 
     Args:
         customer_code: Código do customer (ex: "305S3073SPA")
         invoice_numbers: Lista de números de invoices para buscar
+        dispute_service: DisputeService já configurado (opcional; reutiliza token/rate limiter)
+        type_probe: InvoiceTypeProbe compartilhado (opcional; aprende a ordem dos invoiceType)
 
     Returns:
         Dict com estatísticas do processo
@@ -114,9 +191,8 @@ def fetch_and_insert_missing_invoices(customer_code: str, invoice_numbers: list)
     logger.info("=" * 80)
 
     # Inicializar serviços
-    token_service = TokenService()
-    auth_service = AuthService(token_service)
-    dispute_service = DisputeService(token_service, auth_service)
+    dispute_service = dispute_service or _default_dispute_service()
+    type_probe = type_probe or InvoiceTypeProbe(dispute_service)
 
     # Estatísticas
     stats = {
@@ -131,29 +207,19 @@ def fetch_and_insert_missing_invoices(customer_code: str, invoice_numbers: list)
     logger.info(f"\nTotal de invoices para processar: {len(invoice_numbers)}")
     logger.info("=" * 80)
 
+    # 1. Buscar invoices na API - em lote, tipo mais provável primeiro, demais em paralelo
+    found = type_probe.find_many(invoice_numbers, customer_code)
+    to_insert = []
+
     # Processar cada invoice
     for idx, invoice_num in enumerate(invoice_numbers, 1):
         try:
             logger.info(f"\n[{idx}/{len(invoice_numbers)}] Processando invoice {invoice_num}...")
 
-            # 1. Buscar invoice na API - TESTA TODOS OS STATUS POSSÍVEIS
-            invoice_types_to_try = ["PAID", "OPEN", "OVERDUE", "DISPUTED", "CREDIT", "DEBIT"]
-            invoice_data = None
-
-            for invoice_type in invoice_types_to_try:
-                invoice_data = dispute_service.get_invoice_info(
-                    invoice_number=invoice_num,
-                    customer_code=customer_code,
-                    invoice_type=invoice_type
-                )
-
-                if invoice_data and invoice_data.get("invoices"):
-                    logger.info(f"   Encontrada em: {invoice_type}")
-                    break
-
             # 2. Verificar se encontrou
-            if invoice_data and invoice_data.get("invoices"):
-                invoice = invoice_data["invoices"][0]
+            invoice, invoice_type = found.get(str(invoice_num), (None, None))
+            if invoice:
+                logger.info(f"   Encontrada em: {invoice_type}")
                 stats["encontradas_api"] += 1
 
                 # DEBUG: Ver todos os campos disponíveis
@@ -180,30 +246,40 @@ def fetch_and_insert_missing_invoices(customer_code: str, invoice_numbers: list)
 
                 logger.info(f"   API - Valor: {invoice_to_insert['moeda']} {invoice_to_insert['valor']}")
 
-                # 3. Inserir no banco
-                if insert_invoice_into_db(invoice_to_insert):
-                    stats["inseridas_banco"] += 1
-                    logger.info(f"   BD - Invoice inserida com sucesso!")
-                else:
-                    stats["erros_insercao"] += 1
-                    logger.warning(f"   BD - Erro ao inserir no banco")
+                # 3. Acumular para inserção em lote
+                to_insert.append(invoice_to_insert)
 
             else:
                 stats["nao_encontradas_api"] += 1
                 logger.warning(f"   API - Invoice nao encontrada")
 
-            # Delay para não sobrecarregar API
-            if idx % 10 == 0:
-                logger.info(f"\nPausa de 2s (processadas {idx}/{len(invoice_numbers)})...")
-                time.sleep(2)
-            else:
-                time.sleep(0.5)
-
         except Exception as e:
             stats["erros_busca"] += 1
             logger.error(f"Erro ao processar invoice {invoice_num}: {e}")
             continue
 
+    # 4. Inserir no banco em lote (uma conexão, uma transação)
+    if to_insert:
+        logger.info(f"\nInserindo {len(to_insert)} invoices no banco...")
+        try:
+            results = insert_invoices_into_db(to_insert)
+        except Exception as e:
+            logger.error(f"Erro ao inserir invoices no banco: {e}")
+            results = {inv["numero_invoice"]: str(e) for inv in to_insert}
+
+        for numero, error in results.items():
+            if error is None:
+                stats["inseridas_banco"] += 1
+            else:
+                stats["erros_insercao"] += 1
+                logger.warning(f"   BD - Erro ao inserir invoice {numero}: {error}")
+
+    # Persistir acertos por invoiceType para as próximas execuções
+    try:
+        type_probe.save()
+    except Exception as e:
+        logger.warning(f"Não foi possível salvar estatísticas de invoiceType: {e}")
+
     # Relatório final
     logger.info("\n" + "=" * 80)
     logger.info("RELATORIO FINAL")
@@ -219,41 +295,47 @@ def fetch_and_insert_missing_invoices(customer_code: str, invoice_numbers: list)
     return stats
 
 
-def get_missing_invoices_from_disputes(customer_code: str) -> list:
+def get_missing_invoices_from_disputes(
+        customer_code: str,
+        dispute_service: DisputeService = None,
+        snapshot: DisputeSnapshot = None
+) -> list:
     """
     Identifica invoices que têm disputa mas não estão no banco.
     Retorna lista de números de invoices para buscar.
+    Se `snapshot` for informado, usa as disputas já listadas nesta execução.
     """
     logger.info("=" * 80)
     logger.info("IDENTIFICANDO INVOICES FALTANTES")
     logger.info("=" * 80)
 
-    token_service = TokenService()
-    auth_service = AuthService(token_service)
-    dispute_service = DisputeService(token_service, auth_service)
     invoice_repo = InvoiceRepository()
 
-    # 1. Buscar todas as disputas da API
-    logger.info("\n[1] Buscando disputas da API...")
-    all_disputes = dispute_service.list_all_disputes(customer_code)
-    logger.info(f"{len(all_disputes)} disputas encontradas na API")
-
-    # 2. Buscar todas as invoices do banco
-    logger.info("\n[2] Buscando invoices do banco...")
+    # 1. Buscar todas as invoices do banco
+    logger.info("\n[1] Buscando invoices do banco...")
     all_invoices = invoice_repo.fetch_invoices_maersk(limit=100000)
     invoice_numbers_in_db = {inv["numero_invoice"] for inv in all_invoices}
     logger.info(f"{len(invoice_numbers_in_db)} invoices MAERSK no banco")
 
-    # 3. Identificar invoices faltantes
-    logger.info("\n[3] Identificando invoices faltantes...")
-    missing_invoices = []
-    for dispute in all_disputes:
-        invoice_num = dispute.get("invoiceNumber")
-        if invoice_num and invoice_num not in invoice_numbers_in_db:
-            missing_invoices.append(invoice_num)
-
-    # Remover duplicatas
-    missing_invoices = list(set(missing_invoices))
+    # 2. Identificar invoices faltantes
+    if snapshot is not None:
+        logger.info("\n[2] Usando snapshot de disputas da execução...")
+        disputed_invoices = snapshot.dispute_map.keys()
+        total_disputes = snapshot.total_disputes
+    else:
+        # Percorre as disputas da API (todas as páginas, em streaming)
+        logger.info("\n[2] Buscando disputas da API e identificando invoices faltantes...")
+        dispute_service = dispute_service or _default_dispute_service()
+        disputed_invoices = set()
+        total_disputes = 0
+        for dispute in dispute_service.iter_all_disputes(customer_code):
+            total_disputes += 1
+            invoice_num = dispute.get("invoiceNumber")
+            if invoice_num:
+                disputed_invoices.add(invoice_num)
+    logger.info(f"{total_disputes} disputas encontradas na API")
+
+    missing_invoices = [num for num in disputed_invoices if num not in invoice_numbers_in_db]
 
     logger.info(f"{len(missing_invoices)} invoices faltantes identificadas")
     logger.info("=" * 80)
@@ -288,7 +370,6 @@ def main():
 
     # Confirmação
     logger.info(f"\nSerao processadas {len(missing_invoices)} invoices")
-    logger.info(f"Tempo estimado: ~{int(len(missing_invoices) * 0.7 / 60)} minutos")
     logger.info("\nIniciando em 3 segundos... (Ctrl+C para cancelar)")
     time.sleep(3)
 
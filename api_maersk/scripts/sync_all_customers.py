@@ -5,48 +5,64 @@ sys.path.insert(0, str(Path(__file__).parent.parent))
 
 from api_maersk.services.token_service import TokenService
 from api_maersk.services.auth_service import AuthService
-from api_maersk.services.dispute_service import DisputeService
+from api_maersk.services.dispute_service import DisputeService, shared_rate_limiter
 from api_maersk.services.dispute_sync_service import DisputeSyncService
+from api_maersk.services.dispute_snapshot import DisputeSnapshot
 from api_maersk.repos.invoice_repository import InvoiceRepository
 from api_maersk.repos.disputa_repository import DisputaRepository
+from api_maersk.config.settings import CUSTOMER_MAX_WORKERS
 from api_maersk.utils.logger import setup_logger
+from concurrent.futures import ThreadPoolExecutor, as_completed
 import time
 
 logger = setup_logger(__name__)
 
 
-def sync_single_customer(customer_code: str, customer_name: str):
+def sync_single_customer(customer_code: str, customer_name: str, dispute_service: DisputeService = None):
     """
     Sincroniza invoices e disputas de um único cliente.
+
+    Args:
+        dispute_service: DisputeService compartilhado (token + rate limiter).
+                         Se ausente, cria serviços próprios para o cliente.
     """
     logger.info("=" * 80)
     logger.info(f"PROCESSANDO CLIENTE: {customer_name} ({customer_code})")
     logger.info("=" * 80)
 
     # Inicializar serviços
-    token_service = TokenService()
-    auth_service = AuthService(token_service)
-    dispute_service = DisputeService(token_service, auth_service)
+    if dispute_service is None:
+        token_service = TokenService()
+        auth_service = AuthService(token_service)
+        dispute_service = DisputeService(token_service, auth_service)
     invoice_repo = InvoiceRepository()
     disputa_repo = DisputaRepository()
     sync_service = DisputeSyncService(dispute_service, invoice_repo, disputa_repo)
 
+    # Disputas listadas uma única vez para as duas etapas
+    snapshot = DisputeSnapshot.fetch(dispute_service, customer_code)
+
     # Importar invoices faltantes
     logger.info(f"\n[1] Importando invoices faltantes...")
-    from tests.import_missing_invoices import get_missing_invoices_from_disputes, fetch_and_insert_missing_invoices
+    from api_maersk.scripts.import_missing_invoices import (
+        get_missing_invoices_from_disputes,
+        fetch_and_insert_missing_invoices
+    )
 
-    missing_invoices = get_missing_invoices_from_disputes(customer_code)
+    missing_invoices = get_missing_invoices_from_disputes(customer_code, snapshot=snapshot)
 
     if missing_invoices:
         logger.info(f"Encontradas {len(missing_invoices)} invoices faltantes")
-        stats_import = fetch_and_insert_missing_invoices(customer_code, missing_invoices)
+        stats_import = fetch_and_insert_missing_invoices(
+            customer_code, missing_invoices, dispute_service=dispute_service
+        )
         logger.info(f"Importadas: {stats_import['inseridas_banco']} invoices")
     else:
         logger.info("Nenhuma invoice faltante")
 
     # Sincronizar disputas
     logger.info(f"\n[2] Sincronizando disputas...")
-    stats_sync = sync_service.sync_disputes(customer_code, limit=10000)
+    stats_sync = sync_service.sync_disputes(customer_code, limit=10000, snapshot=snapshot)
 
     logger.info("\n" + "=" * 80)
     logger.info(f"RESUMO - {customer_name}")
@@ -59,9 +75,13 @@ def sync_single_customer(customer_code: str, customer_name: str):
     return stats_sync
 
 
-def sync_all_customers():
+def sync_all_customers(concurrent: bool = False):
     """
     Processa TODOS os 5 clientes automaticamente.
+
+    Args:
+        concurrent: Processa os clientes ao mesmo tempo, com um único
+                    orçamento de requisições (rate limiter) para todos.
     """
     logger.info("\n" + "=" * 80)
     logger.info("SINCRONIZAÇÃO DE TODOS OS CLIENTES")
@@ -69,6 +89,11 @@ def sync_all_customers():
 
     # Inicializar TokenService para pegar lista de clientes
     token_service = TokenService()
+
+    # Renova antes de começar os tokens que expirariam durante a execução
+    if not token_service.ensure_fresh_tokens(AuthService(token_service)):
+        logger.warning("Renovação antecipada de tokens falhou; seguindo com os tokens atuais")
+
     all_customers = token_service.get_all_customers()
 
     if not all_customers:
@@ -92,29 +117,50 @@ def sync_all_customers():
         "clientes_com_erro": []
     }
 
-    # Processar cada cliente
-    for idx, (customer_code, customer_data) in enumerate(all_customers.items(), 1):
-        customer_name = customer_data.get('name', 'Unknown')
+    # Um único DisputeService (token + rate limiter adaptativo) para todos os clientes
+    shared_dispute_service = DisputeService(
+        token_service, AuthService(token_service), rate_limiter=shared_rate_limiter()
+    )
 
-        try:
-            logger.info(f"\n{'#' * 80}")
-            logger.info(f"CLIENTE {idx}/{len(all_customers)}")
-            logger.info(f"{'#' * 80}\n")
+    # Processar cada cliente
+    if concurrent:
+        logger.info(f"Processando {len(all_customers)} clientes em paralelo...")
+
+        with ThreadPoolExecutor(max_workers=CUSTOMER_MAX_WORKERS) as executor:
+            futures = {
+                executor.submit(
+                    sync_single_customer, customer_code, customer_data.get('name', 'Unknown'), shared_dispute_service
+                ): customer_data.get('name', 'Unknown')
+                for customer_code, customer_data in all_customers.items()
+            }
+
+            for future in as_completed(futures):
+                customer_name = futures[future]
+                try:
+                    stats = future.result()
+                    global_stats["clientes_processados"] += 1
+                    global_stats["total_disputas"] += stats.get("disputas_salvas", 0)
+                except Exception as e:
+                    logger.error(f"Erro ao processar {customer_name}: {e}")
+                    global_stats["clientes_com_erro"].append(customer_name)
+    else:
+        for idx, (customer_code, customer_data) in enumerate(all_customers.items(), 1):
+            customer_name = customer_data.get('name', 'Unknown')
 
-            stats = sync_single_customer(customer_code, customer_name)
+            try:
+                logger.info(f"\n{'#' * 80}")
+                logger.info(f"CLIENTE {idx}/{len(all_customers)}")
+                logger.info(f"{'#' * 80}\n")
 
-            global_stats["clientes_processados"] += 1
-            global_stats["total_disputas"] += stats.get("disputas_salvas", 0)
+                stats = sync_single_customer(customer_code, customer_name, shared_dispute_service)
 
-            # Pausa entre clientes para não sobrecarregar API
-            if idx < len(all_customers):
-                logger.info(f"\nPausa de 10s antes do proximo cliente...\n")
-                time.sleep(10)
+                global_stats["clientes_processados"] += 1
+                global_stats["total_disputas"] += stats.get("disputas_salvas", 0)
 
-        except Exception as e:
-            logger.error(f"Erro ao processar {customer_name}: {e}")
-            global_stats["clientes_com_erro"].append(customer_name)
-            continue
+            except Exception as e:
+                logger.error(f"Erro ao processar {customer_name}: {e}")
+                global_stats["clientes_com_erro"].append(customer_name)
+                continue
 
     # Relatório final global
     logger.info("\n" + "=" * 80)
@@ -137,8 +183,9 @@ def sync_all_customers():
 def main():
     """
     Processa TODOS os clientes automaticamente sem perguntar.
+    Use --concurrent para processar os clientes em paralelo.
     """
-    sync_all_customers()
+    sync_all_customers(concurrent="--concurrent" in sys.argv[1:])
 
 
 if __name__ == "__main__":
@@ -37,7 +37,7 @@ def main():
     total_stats = {
         "total_invoices": 0,
         "com_disputa": 0,
-        "sem_disputa": 0,
+        "sem_invoice": 0,
         "disputas_salvas": 0,
         "erros": 0
     }
@@ -63,7 +63,7 @@ def main():
             if "erro" not in stats:
                 total_stats["total_invoices"] += stats.get("total_invoices", 0)
                 total_stats["com_disputa"] += stats.get("com_disputa", 0)
-                total_stats["sem_disputa"] += stats.get("sem_disputa", 0)
+                total_stats["sem_invoice"] += stats.get("sem_invoice", 0)
                 total_stats["disputas_salvas"] += stats.get("disputas_salvas", 0)
                 total_stats["erros"] += stats.get("erros", 0)
 
@@ -77,9 +77,9 @@ def main():
     print("\n" + "=" * 80)
     print("RESUMO FINAL - TODOS OS CLIENTES")
     print("=" * 80)
-    print(f"Total de invoices processadas: {total_stats['total_invoices']}")
-    print(f"Com disputa: {total_stats['com_disputa']}")
-    print(f"Sem disputa: {total_stats['sem_disputa']}")
+    print(f"Invoices com disputa processadas: {total_stats['total_invoices']}")
+    print(f"Disputas consultadas: {total_stats['com_disputa']}")
+    print(f"Disputas sem invoice no banco: {total_stats['sem_invoice']}")
     print(f"Disputas salvas: {total_stats['disputas_salvas']}")
     print(f"Erros: {total_stats['erros']}")
     print(f"\nTempo total: {elapsed:.2f} segundos")
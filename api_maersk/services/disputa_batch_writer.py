@@ -0,0 +1,88 @@
+import queue
+import threading
+import time
+from typing import Dict
+
+from api_maersk.repos.disputa_repository import DisputaRepository
+from api_maersk.utils.logger import setup_logger
+
+logger = setup_logger(__name__)
+
+
+class DisputaBatchWriter:
+    """
+    Write-behind de disputas: os workers enfileiram as linhas prontas
+    e uma única thread grava em lote (a cada `batch_size` linhas ou
+    `flush_interval_ms`), sem disputar com as threads de HTTP.
+    """
+
+    _STOP = object()
+
+    def __init__(self, disputa_repo: DisputaRepository, batch_size: int = 100, flush_interval_ms: int = 500):
+        self.disputa_repo = disputa_repo
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval_ms / 1000
+        self.saved = 0
+        self.errors = 0
+        self._queue: queue.Queue = queue.Queue()
+        self._thread = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def start(self) -> None:
+        self._thread = threading.Thread(target=self._run, name="disputa-writer", daemon=True)
+        self._thread.start()
+
+    def put(self, row: Dict) -> None:
+        """Enfileira uma linha (chaves de DISPUTA_COLUMNS) para gravação."""
+        self._queue.put(row)
+
+    def close(self) -> Dict:
+        """Grava o que restou na fila e encerra a thread."""
+        if self._thread:
+            self._queue.put(self._STOP)
+            self._thread.join()
+            self._thread = None
+        return {"salvas": self.saved, "erros": self.errors}
+
+    def _run(self) -> None:
+        buffer = []
+        deadline = time.monotonic() + self.flush_interval
+
+        while True:
+            try:
+                item = self._queue.get(timeout=max(0.0, deadline - time.monotonic()))
+            except queue.Empty:
+                item = None
+
+            if item is self._STOP:
+                self._flush(buffer)
+                return
+
+            if item is not None:
+                buffer.append(item)
+
+            if len(buffer) >= self.batch_size or time.monotonic() >= deadline:
+                self._flush(buffer)
+                buffer = []
+                deadline = time.monotonic() + self.flush_interval
+
+    def _flush(self, buffer: list) -> None:
+        if not buffer:
+            return
+        try:
+            results = self.disputa_repo.insert_or_update_many(buffer)
+        except Exception as e:
+            logger.error(f"Erro ao gravar lote de {len(buffer)} disputas: {e}")
+            self.errors += len(buffer)
+            return
+
+        # Linhas com erro já foram refeitas uma a uma pelo repositório
+        failed = sum(1 for error in results.values() if error is not None)
+        self.saved += len(results) - failed
+        self.errors += failed
@@ -1,25 +1,149 @@
+import math
+import threading
+import time
 import requests
-from typing import Dict, List, Optional
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterator, List, Optional
+from urllib.parse import urlparse
 import json
 
-from api_maersk.config.settings import API_BASE_URL, CONSUMER_KEY, CARRIER_CODE
+from api_maersk.config.settings import (
+    API_BASE_URL, CONSUMER_KEY, CARRIER_CODE, DISPUTE_PAGE_WORKERS, INVOICES_MAX_URL_LENGTH,
+    API_RATE_LIMIT, API_RATE_BURST, API_RATE_MIN, API_RATE_MAX, API_RETRY_ATTEMPTS, API_RETRY_BASE_DELAY
+)
 from api_maersk.services.token_service import TokenService
 from api_maersk.services.auth_service import AuthService
 from api_maersk.utils.logger import setup_logger
+from api_maersk.utils.rate_limiter import AdaptiveRateLimiter, parse_retry_after
+from api_maersk.utils.retry import RetryPolicy
 
 logger = setup_logger(__name__)
 
+_shared_rate_limiter: Optional[AdaptiveRateLimiter] = None
+_shared_rate_limiter_lock = threading.Lock()
+
+
+class DisputeListingError(RuntimeError):
+    """A listagem de disputas não pôde ser concluída (token ou página com falha)."""
+
+
+def shared_rate_limiter() -> AdaptiveRateLimiter:
+    """
+    Rate limiter único do processo (configurado em settings), usado por
+    padrão por todos os DisputeService: o orçamento de requisições é global.
+    """
+    global _shared_rate_limiter
+    with _shared_rate_limiter_lock:
+        if _shared_rate_limiter is None:
+            _shared_rate_limiter = AdaptiveRateLimiter(
+                API_RATE_LIMIT, API_RATE_BURST, min_rate=API_RATE_MIN, max_rate=API_RATE_MAX
+            )
+        return _shared_rate_limiter
+
 
 class DisputeService:
     """Serviço para gerenciamento de disputas e invoices via API Maersk."""
 
-    def __init__(self, token_service: TokenService, auth_service: AuthService):
+    def __init__(
+            self,
+            token_service: TokenService,
+            auth_service: AuthService,
+            rate_limiter: Optional[AdaptiveRateLimiter] = None,
+            retry_policy: Optional[RetryPolicy] = None
+    ):
         self.token_service = token_service
         self.auth_service = auth_service
+        # Orçamento de requisições (compartilhado entre clientes/threads)
+        self.rate_limiter = rate_limiter or shared_rate_limiter()
+        self.retry_policy = retry_policy or RetryPolicy(API_RETRY_ATTEMPTS, API_RETRY_BASE_DELAY)
 
     # -------------------------
     # Internos
     # -------------------------
+    @staticmethod
+    def _limiter_key(url: str, headers: Dict) -> str:
+        """Cada host + consumer-key tem seu próprio limite na API."""
+        return f"{urlparse(url).netloc}|{headers.get('consumer-key', '')}"
+
+    def _renew_token(self, customer_code: str, failed_token: str) -> Optional[str]:
+        """
+        Token recusado com 401: usa o token mais novo já disponível (outra
+        thread/processo pode ter renovado) ou renova todos via AuthService.
+        """
+        token = self.token_service.get_token(customer_code)
+        if token and token != failed_token and self.token_service.is_token_valid(token):
+            return token
+
+        if not self.auth_service:
+            self.token_service.load_tokens()
+            token = self.token_service.get_token(customer_code)
+            valid = token and token != failed_token and self.token_service.is_token_valid(token)
+            return token if valid else None
+
+        all_tokens = self.token_service.refresh_tokens(self.auth_service, customer_code, failed_token)
+        token = all_tokens.get(customer_code, {}).get("id_token")
+        return token if token and token != failed_token else None
+
+    def _request(
+            self,
+            method: str,
+            url: str,
+            headers: Dict,
+            customer_code: Optional[str] = None,
+            idempotent: Optional[bool] = None,
+            **kwargs
+    ) -> requests.Response:
+        """
+        Executa uma requisição passando pelo rate limiter: espera um token
+        da chave (host + consumer-key) e informa o status da resposta para
+        o limiter acelerar ou recuar (429/5xx, Retry-After).
+
+        Falhas transitórias (conexão, timeout, 429/5xx) são repetidas com
+        backoff conforme a retry_policy, só em requisições idempotentes
+        (GET ou `idempotent=True`). Com `customer_code` (código do token),
+        um 401 renova o token UMA vez e repete a requisição.
+        """
+        key = self._limiter_key(url, headers)
+        idempotent = self.retry_policy.is_idempotent(method, idempotent)
+        token_renewed = False
+        attempt = 0
+
+        while True:
+            attempt += 1
+            self.rate_limiter.acquire(key)
+
+            try:
+                response = requests.request(method, url, headers=headers, timeout=30, **kwargs)
+            except requests.exceptions.RequestException as e:
+                if not self.retry_policy.should_retry(attempt, idempotent, error=e):
+                    raise
+                wait = self.retry_policy.delay(attempt)
+                logger.warning(f"{method} falhou ({e}); tentativa {attempt + 1} em {wait:.1f}s")
+                time.sleep(wait)
+                continue
+
+            retry_after = response.headers.get("Retry-After")
+            self.rate_limiter.on_response(key, response.status_code, retry_after)
+
+            if response.status_code == 401 and customer_code and not token_renewed:
+                token_renewed = True
+                failed_token = headers.get("Authorization", "")[len("Bearer "):]
+                new_token = self._renew_token(customer_code, failed_token)
+                if new_token:
+                    logger.info(f"Token renovado para {customer_code}; repetindo requisição")
+                    headers = {**headers, "Authorization": f"Bearer {new_token}"}
+                    attempt -= 1  # a renovação não consome tentativa
+                    continue
+                return response
+
+            if not self.retry_policy.should_retry(attempt, idempotent, status_code=response.status_code):
+                return response
+
+            wait = self.retry_policy.delay(attempt, parse_retry_after(retry_after))
+            logger.warning(f"{method} status {response.status_code}; tentativa {attempt + 1} em {wait:.1f}s")
+            time.sleep(wait)
+
     def _build_headers(self, token: str, customer_code: str, accept: str) -> Dict:
         """Monta headers para requisições à API Maersk."""
         return {
@@ -42,13 +166,17 @@ class DisputeService:
             token: str,
             customer_code: str,
             accept: str = "application/vnd.ohp.dispute.v1+json",
+            token_customer: Optional[str] = None,
     ) -> Optional[Dict]:
-        """Executa chamada GET na API Maersk."""
+        """
+        Executa chamada GET na API Maersk.
+        `token_customer` (código do arquivo de tokens) permite renovar o token em 401.
+        """
         url = f"{API_BASE_URL}{endpoint}"
         headers = self._build_headers(token, customer_code, accept)
 
         try:
-            response = requests.get(url, headers=headers, timeout=30)
+            response = self._request("GET", url, headers, customer_code=token_customer)
             logger.info(f"GET {endpoint} - Status: {response.status_code}")
 
             if response.status_code == 200:
@@ -89,6 +217,7 @@ class DisputeService:
             token,
             api_code,
             "application/vnd.ohp.dispute.v1+json",
+            token_customer=customer_code,
         )
 
     def get_dispute_comments(
@@ -105,6 +234,7 @@ class DisputeService:
             f"/disputes-external/api/dispute/{dispute_id}/comment?limit={limit}&page={page}",
             token,
             api_code,
+            token_customer=customer_code,
         )
         return data.get("comments", []) if data else None
 
@@ -121,6 +251,7 @@ class DisputeService:
             token,
             api_code,
             "application/vnd.ohp.dispute.v2+json",
+            token_customer=customer_code,
         )
         return data.get("attachments", []) if data else None
 
@@ -175,7 +306,10 @@ class DisputeService:
 
         try:
             logger.info(f"Payload enviado: {json.dumps(payload, indent=2)}")
-            response = requests.post(url, headers=headers, json=payload, timeout=30)
+            # Busca (POST só de leitura): pode ser repetida
+            response = self._request(
+                "POST", url, headers, customer_code=customer_code, idempotent=True, json=payload
+            )
             logger.info(f"POST {url} - Status: {response.status_code}")
 
             if response.status_code == 200:
@@ -195,33 +329,18 @@ class DisputeService:
             logger.error(f"Erro na requisição: {e}")
             return []
 
-    def list_all_disputes(self, customer_code: str, page_size: int = 337) -> List[Dict]:
-        """
-        Lista TODAS as disputas do customer (sem filtros).
-        Retorna lista de disputas com invoiceNumber e ohpDisputeId.
-        """
-        result = self._get_token_and_api_code(customer_code)
-        if not result:
-            return []
-        api_code, token = result
-
-        url = f"{API_BASE_URL}/disputes-external/api/dispute/search/filter?page_no=0&page_size={page_size}"
-
+    def _fetch_disputes_page(
+            self, token: str, api_code: str, page_no: int, page_size: int, token_customer: Optional[str] = None
+    ) -> Optional[Dict]:
+        """Busca UMA página de /dispute/search/filter (sem filtros). Retorna o JSON ou None."""
+        url = (
+            f"{API_BASE_URL}/disputes-external/api/dispute/search/filter"
+            f"?page_no={page_no}&page_size={page_size}"
+        )
         headers = {
-            "Authorization": f"Bearer {token}",
-            "consumer-key": CONSUMER_KEY,
-            "carrier-code": CARRIER_CODE.lower(),
-            "customer-code": api_code,
+            **self._build_headers(token, api_code, "application/vnd.ohp.dispute.v1+json"),
             "content-type": "application/json",
-            "accept": "application/vnd.ohp.dispute.v1+json",
-            "Origin": "https://www.maersk.com",
-            "Referer": "https://www.maersk.com/",
-            "User-Agent": (
-                "Mozilla/5.0 (Windows NT 10.0; Win64; x64) "
-                "AppleWebKit/537.36 (KHTML, like Gecko) Chrome/140.0.0.0 Safari/537.36"
-            ),
         }
-
         payload = {
             "object_id": "disputes-view",
             "filters": [],  # SEM FILTROS - lista todas
@@ -231,49 +350,110 @@ class DisputeService:
         }
 
         try:
-            logger.info(f"Payload: {json.dumps(payload, indent=2)}")
-            response = requests.post(url, headers=headers, json=payload, timeout=30)
-            logger.info(f"POST {url} - Status: {response.status_code}")
+            response = self._request(
+                "POST", url, headers, customer_code=token_customer, idempotent=True, json=payload
+            )
+            logger.info(f"POST dispute/search/filter page_no={page_no} - Status: {response.status_code}")
 
             if response.status_code == 200:
-                data = response.json()
-                logger.info(f"Resposta: {json.dumps(data, indent=2)[:500]}")
-                disputes = data.get("search_records", [])
-                logger.info(f"Encontradas {len(disputes)} disputas")
-                return disputes
-            else:
-                logger.error(f"Erro {response.status_code}: {response.text[:200]}")
-                return []
+                return response.json()
+
+            logger.error(f"Erro {response.status_code}: {response.text[:200]}")
+            return None
 
         except Exception as e:
             logger.error(f"Erro: {e}")
-            return []
-    # -------------------------
-    # Invoices
-    # -------------------------
-    def get_invoice_info(
-            self, invoice_number: str, customer_code: str, invoice_type: str = "OPEN"
-    ) -> Optional[Dict]:
-        """Consulta endpoint /invoices."""
+            return None
+
+    @staticmethod
+    def _total_records(data: Dict) -> Optional[int]:
+        """Total de disputas informado pela API (se vier na resposta)."""
+        for key in ("total_records", "totalRecords", "total_count", "totalCount", "total"):
+            value = data.get(key)
+            if isinstance(value, int):
+                return value
+        return None
+
+    @staticmethod
+    def _page_records(data: Optional[Dict], api_code: str) -> List[Dict]:
+        """Registros de uma página da listagem; página com falha interrompe a listagem."""
+        if data is None:
+            raise DisputeListingError(f"Falha ao buscar página de disputas de {api_code}; listagem incompleta")
+        return data.get("search_records", [])
+
+    def iter_all_disputes(
+            self, customer_code: str, page_size: int = 337, page_workers: int = DISPUTE_PAGE_WORKERS
+    ) -> Iterator[Dict]:
+        """
+        Percorre TODAS as páginas de disputas do customer, entregando os
+        registros conforme chegam (memória constante para clientes grandes).
+
+        Se a API informar o total na primeira página e page_workers > 1,
+        as páginas restantes são buscadas em paralelo (janela de
+        page_workers páginas), mantendo a ordem. Sem total, segue página
+        a página até receber uma página incompleta.
+
+        Se o token ou alguma página falhar, lança DisputeListingError: uma
+        listagem parcial não pode ser tratada como a lista completa.
+        """
         result = self._get_token_and_api_code(customer_code)
         if not result:
-            return None
+            raise DisputeListingError(f"Sem token válido para listar disputas de {customer_code}")
         api_code, token = result
 
-        endpoint = (
-            f"/invoices?searchType=INV_NOS"
-            f"&ids={invoice_number}"
-            f"&customerCodeCMD={api_code}"
-            f"&carrierCode={CARRIER_CODE}"
-            f"&invoiceType={invoice_type}"
-            f"&isSelected=true"
-            f"&isCreditCountry=true"
-        )
-
-        url = f"{API_BASE_URL}{endpoint}"
+        first = self._fetch_disputes_page(token, api_code, 0, page_size, customer_code)
+        records = self._page_records(first, api_code)
+        yield from records
+
+        total = self._total_records(first)
+
+        if total is not None:
+            pages = range(1, math.ceil(total / page_size))
+            logger.info(f"{total} disputas em {len(pages) + 1} páginas para {api_code}")
+
+            with ThreadPoolExecutor(max_workers=max(1, page_workers)) as executor:
+                window = deque()
+                for page_no in pages:
+                    window.append(executor.submit(
+                        self._fetch_disputes_page, token, api_code, page_no, page_size, customer_code
+                    ))
+                    if len(window) >= page_workers:
+                        yield from self._page_records(window.popleft().result(), api_code)
+
+                while window:
+                    yield from self._page_records(window.popleft().result(), api_code)
+            return
+
+        page_no = 1
+        while len(records) == page_size:
+            data = self._fetch_disputes_page(token, api_code, page_no, page_size, customer_code)
+            previous, records = records, self._page_records(data, api_code)
+            if records and previous and records[0].get("ohpDisputeId") == previous[0].get("ohpDisputeId"):
+                logger.warning("API retornou a mesma página novamente; paginação encerrada")
+                return
+
+            yield from records
+            page_no += 1
+
+    def list_all_disputes(
+            self, customer_code: str, page_size: int = 337, page_workers: int = DISPUTE_PAGE_WORKERS
+    ) -> List[Dict]:
+        """
+        Lista TODAS as disputas do customer (sem filtros), em todas as páginas.
+        Retorna lista de disputas com invoiceNumber e ohpDisputeId.
+        Lança DisputeListingError se a listagem não puder ser concluída.
+        """
+        disputes = list(self.iter_all_disputes(customer_code, page_size, page_workers))
+        logger.info(f"Encontradas {len(disputes)} disputas")
+        return disputes
 
+    # -------------------------
+    # Invoices
+    # -------------------------
+    @staticmethod
+    def _invoices_headers(token: str) -> Dict:
         # USA CONSUMER-KEY DIFERENTE PARA /invoices
-        headers = {
+        return {
             "Authorization": f"Bearer {token}",
             "consumer-key": "SqsiObucFhI8PTFlsakGygUALAVLQ0yT",  # CONSUMER-KEY ESPECÍFICO
             "accept": "*/*",
@@ -285,9 +465,28 @@ class DisputeService:
             ),
         }
 
+    @staticmethod
+    def _invoices_endpoint(ids: str, api_code: str, invoice_type: str) -> str:
+        return (
+            f"/invoices?searchType=INV_NOS"
+            f"&ids={ids}"
+            f"&customerCodeCMD={api_code}"
+            f"&carrierCode={CARRIER_CODE}"
+            f"&invoiceType={invoice_type}"
+            f"&isSelected=true"
+            f"&isCreditCountry=true"
+        )
+
+    def _fetch_invoices(
+            self, ids: str, token: str, api_code: str, invoice_type: str, token_customer: Optional[str] = None
+    ) -> Optional[Dict]:
+        """GET /invoices para um ou mais números (separados por vírgula)."""
+        endpoint = self._invoices_endpoint(ids, api_code, invoice_type)
+        url = f"{API_BASE_URL}{endpoint}"
+
         try:
-            response = requests.get(url, headers=headers, timeout=30)
-            logger.info(f"GET {endpoint} - Status: {response.status_code}")
+            response = self._request("GET", url, self._invoices_headers(token), customer_code=token_customer)
+            logger.info(f"GET {endpoint[:120]} - Status: {response.status_code}")
 
             if response.status_code == 200:
                 return response.json()
@@ -298,6 +497,73 @@ class DisputeService:
             logger.error(f"Erro: {e}")
             return None
 
+    def get_invoice_info(
+            self, invoice_number: str, customer_code: str, invoice_type: str = "OPEN"
+    ) -> Optional[Dict]:
+        """Consulta endpoint /invoices."""
+        result = self._get_token_and_api_code(customer_code)
+        if not result:
+            return None
+        api_code, token = result
+
+        return self._fetch_invoices(invoice_number, token, api_code, invoice_type, customer_code)
+
+    def _chunk_invoice_numbers(
+            self, invoice_numbers: List[str], api_code: str, invoice_type: str, max_url_length: int
+    ) -> Iterator[List[str]]:
+        """Agrupa números de invoice em lotes cuja URL fique abaixo de max_url_length."""
+        base_length = len(API_BASE_URL) + len(self._invoices_endpoint("", api_code, invoice_type))
+        chunk, length = [], base_length
+
+        for number in invoice_numbers:
+            extra = len(number) + (1 if chunk else 0)  # vírgula
+            if chunk and length + extra > max_url_length:
+                yield chunk
+                chunk, length = [], base_length
+                extra = len(number)
+            chunk.append(number)
+            length += extra
+
+        if chunk:
+            yield chunk
+
+    def get_invoices_info(
+            self,
+            invoice_numbers: List[str],
+            customer_code: str,
+            invoice_type: str = "OPEN",
+            max_url_length: int = INVOICES_MAX_URL_LENGTH
+    ) -> Dict[str, Dict]:
+        """
+        Versão em lote de get_invoice_info: envia vários números por
+        requisição (ids=A,B,C), em lotes limitados pelo tamanho da URL.
+
+        Retorna {numero_invoice: invoice} apenas com as invoices encontradas.
+        """
+        found: Dict[str, Dict] = {}
+        if not invoice_numbers:
+            return found
+
+        result = self._get_token_and_api_code(customer_code)
+        if not result:
+            return found
+        api_code, token = result
+
+        numbers = [str(n) for n in dict.fromkeys(invoice_numbers)]
+        for chunk in self._chunk_invoice_numbers(numbers, api_code, invoice_type, max_url_length):
+            invoice_data = self._fetch_invoices(",".join(chunk), token, api_code, invoice_type, customer_code)
+            if not invoice_data:
+                continue
+
+            requested = set(chunk)
+            for invoice in invoice_data.get("invoices") or []:
+                number = str(invoice.get("invoiceNo") or invoice.get("invoiceNumber") or "")
+                if number in requested:
+                    found[number] = invoice
+
+        logger.info(f"{len(found)}/{len(numbers)} invoices encontradas em {invoice_type}")
+        return found
+
     def check_invoice_has_dispute(self, invoice_number: str, customer_code: str) -> Dict:
         """
         Verifica se uma invoice tem disputa.
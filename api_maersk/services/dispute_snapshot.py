@@ -0,0 +1,49 @@
+from typing import Dict, List
+
+from api_maersk.services.dispute_service import DisputeService
+from api_maersk.utils.logger import setup_logger
+
+logger = setup_logger(__name__)
+
+
+class DisputeSnapshot:
+    """
+    Fotografia das disputas de um cliente em uma execução.
+
+    A listagem de disputas é a chamada mais pesada da API; o snapshot é
+    buscado UMA vez por cliente e repassado às etapas de importação,
+    sincronização e atualização, em vez de cada uma listar de novo.
+    """
+
+    def __init__(self, customer_code: str, dispute_map: Dict[str, Dict], total_disputes: int):
+        self.customer_code = customer_code
+        self.dispute_map = dispute_map  # invoiceNumber -> disputa
+        self.total_disputes = total_disputes
+
+    @classmethod
+    def fetch(cls, dispute_service: DisputeService, customer_code: str) -> "DisputeSnapshot":
+        """
+        Percorre todas as páginas de disputas do cliente e monta o mapa por invoice.
+        Lança DisputeListingError se alguma página falhar (snapshot parcial não é criado).
+        """
+        dispute_map = {}
+        total = 0
+
+        for dispute in dispute_service.iter_all_disputes(customer_code):
+            total += 1
+            invoice_num = dispute.get("invoiceNumber")
+            if invoice_num:
+                dispute_map[invoice_num] = dispute
+
+        logger.info(f"[{customer_code}] Snapshot: {total} disputas, {len(dispute_map)} invoices unicas")
+        return cls(customer_code, dispute_map, total)
+
+    @property
+    def invoice_numbers(self) -> List[str]:
+        return list(self.dispute_map.keys())
+
+    def __len__(self) -> int:
+        return self.total_disputes
+
+    def __bool__(self) -> bool:
+        return self.total_disputes > 0
@@ -1,7 +1,11 @@
 from api_maersk.services.dispute_service import DisputeService
+from api_maersk.services.dispute_snapshot import DisputeSnapshot
 from api_maersk.repos.invoice_repository import InvoiceRepository
 from api_maersk.repos.disputa_repository import DisputaRepository
 from api_maersk.utils.logger import setup_logger
+from api_maersk.utils.dates import normalize_last_modified
+from typing import Dict, List, Optional
+import threading
 import json
 
 logger = setup_logger(__name__)
@@ -18,10 +22,49 @@ class DisputeSyncService:
         self.invoice_repo = invoice_repo
         self.disputa_repo = disputa_repo
 
-    def sync_disputes(self, customer_code: str, limit: int = 20):
+        # Cache em processo: numero_invoice -> invoice_id
+        self._invoice_ids: Dict[str, int] = {}
+        self._invoice_ids_lock = threading.Lock()
+
+    def preload_invoice_ids(self, customer_code: str) -> int:
+        """
+        Carrega no cache os ids de todas as invoices do cliente (1 query).
+        Chamado uma vez por execução de cliente, antes de atualizar disputas.
+        """
+        invoice_ids = self.invoice_repo.fetch_invoice_id_map(customer_code)
+        with self._invoice_ids_lock:
+            self._invoice_ids.update(invoice_ids)
+        logger.info(f"{len(invoice_ids)} invoices de {customer_code} carregadas no cache")
+        return len(invoice_ids)
+
+    def preload_invoice_ids_for(self, invoice_numbers: List[str]) -> int:
+        """
+        Carrega no cache apenas os ids das invoices informadas (ex.: as
+        invoices do snapshot de disputas), em vez de todas as do cliente.
+        """
+        invoice_ids = self.invoice_repo.get_invoice_ids_by_numbers(invoice_numbers)
+        with self._invoice_ids_lock:
+            self._invoice_ids.update(invoice_ids)
+        logger.info(f"{len(invoice_ids)} invoices com disputa carregadas no cache")
+        return len(invoice_ids)
+
+    def _resolve_invoice_id(self, invoice_number: str) -> Optional[int]:
+        """Resolve invoice_id pelo cache; se não estiver, busca direto no banco."""
+        with self._invoice_ids_lock:
+            invoice_id = self._invoice_ids.get(invoice_number)
+        if invoice_id:
+            return invoice_id
+
+        invoice_id = self.invoice_repo.get_invoice_id_by_number(invoice_number)
+        if invoice_id:
+            with self._invoice_ids_lock:
+                self._invoice_ids[invoice_number] = invoice_id
+        return invoice_id
+
+    def sync_disputes(self, customer_code: str, limit: int = 20, snapshot: DisputeSnapshot = None):
         """
         Sincroniza disputas:
-        1. Lista TODAS as disputas da API
+        1. Lista TODAS as disputas da API (ou usa o `snapshot` já listado)
         2. Busca invoices do banco
         3. Faz match invoice <-> disputa
         4. Salva disputas no banco (com TODOS os campos)
@@ -29,21 +72,18 @@ class DisputeSyncService:
         logger.info(f"Iniciando sincronização de disputas para {customer_code}")
 
         # 1. Buscar TODAS as disputas da API
-        logger.info("Buscando todas as disputas da API...")
-        all_disputes = self.dispute_service.list_all_disputes(customer_code)
+        if snapshot is None:
+            logger.info("Buscando todas as disputas da API...")
+            snapshot = DisputeSnapshot.fetch(self.dispute_service, customer_code)
 
-        if not all_disputes:
+        if not snapshot:
             logger.warning("Nenhuma disputa encontrada na API")
             return {"erro": "Nenhuma disputa na API"}
 
-        logger.info(f"Encontradas {len(all_disputes)} disputas na API")
+        logger.info(f"Encontradas {snapshot.total_disputes} disputas na API")
 
-        # 2. Criar mapa: invoiceNumber -> dispute
-        dispute_map = {}
-        for dispute in all_disputes:
-            invoice_num = dispute.get("invoiceNumber")
-            if invoice_num:
-                dispute_map[invoice_num] = dispute
+        # 2. Mapa: invoiceNumber -> dispute
+        dispute_map = snapshot.dispute_map
 
         logger.info(f"Mapa criado com {len(dispute_map)} invoices únicas")
 
@@ -79,7 +119,7 @@ class DisputeSyncService:
                 disputed_amount = dispute.get("disputedAmount")
                 currency = dispute.get("currency")
                 api_created_date = dispute.get("createdDate")
-                api_last_modified = dispute.get("lastModifiedDate")
+                api_last_modified = normalize_last_modified(dispute.get("lastModifiedDate"))
 
                 logger.info(
                     f"Invoice {numero_invoice} tem disputa {dispute_id} "
@@ -153,7 +193,7 @@ class DisputeSyncService:
         disputed_amount = dispute_data.get("disputedAmount")
         currency = dispute_data.get("currency")
         api_created_date = dispute_data.get("createdDate")
-        api_last_modified = dispute_data.get("lastModifiedDate")
+        api_last_modified = normalize_last_modified(dispute_data.get("lastModifiedDate"))
 
         logger.info(
             f"Disputa {dispute_id} - Invoice: {invoice_number} | Status: {status} "
@@ -161,14 +201,8 @@ class DisputeSyncService:
         )
 
         # 3. Atualizar no banco de dados
-        # Primeiro, encontrar o invoice_id pelo número da invoice
-        invoices = self.invoice_repo.fetch_invoices_maersk(limit=1000)
-        invoice_id = None
-
-        for inv in invoices:
-            if inv["numero_invoice"] == invoice_number:
-                invoice_id = inv["id"]
-                break
+        # Primeiro, encontrar o invoice_id pelo número da invoice (cache + lookup direto)
+        invoice_id = self._resolve_invoice_id(invoice_number)
 
         if not invoice_id:
             logger.warning(f"Invoice {invoice_number} não encontrada no banco")
@@ -224,24 +258,25 @@ class DisputeSyncService:
             "erros": 0
         }
 
+        # Buscar dados atualizados das invoices na API (vários ids por requisição)
+        invoices_api = self.dispute_service.get_invoices_info(
+            [inv["numero_invoice"] for inv in invoices],
+            customer_code
+        )
+
         for inv in invoices:
             # Verificar se essa invoice tem disputa no banco
             # (isso requer um SELECT na tabela disputa)
             # Como não temos esse método ainda, vamos assumir que todas têm
+            invoice = invoices_api.get(str(inv["numero_invoice"]))
 
-            # Buscar dados atualizados da invoice na API
-            invoice_data = self.dispute_service.get_invoice_info(
-                invoice_number=inv["numero_invoice"],
-                customer_code=customer_code
-            )
-
-            if not invoice_data or not invoice_data.get("invoices"):
+            if not invoice:
                 continue
 
             stats["total"] += 1
 
             # Se a invoice não é disputável, pode ter disputa ativa
-            if not invoice_data["invoices"][0].get("isDisputable", True):
+            if not invoice.get("isDisputable", True):
                 logger.info(f"Atualizando disputa da invoice {inv['numero_invoice']}")
                 # Aqui precisaríamos do dispute_id
                 # Vamos buscar todas as disputas e fazer match
@@ -1,10 +1,12 @@
 from api_maersk.services.dispute_service import DisputeService
 from api_maersk.repos.invoice_repository import InvoiceRepository
 from api_maersk.repos.disputa_repository import DisputaRepository
+from api_maersk.services.disputa_batch_writer import DisputaBatchWriter
+from api_maersk.services.dispute_snapshot import DisputeSnapshot
 from api_maersk.utils.logger import setup_logger
+from api_maersk.utils.dates import normalize_last_modified
 from concurrent.futures import ThreadPoolExecutor, as_completed
 import json
-import time
 
 logger = setup_logger(__name__)
 
@@ -15,108 +17,113 @@ class DisputeSyncServiceParallel:
             dispute_service: DisputeService,
             invoice_repo: InvoiceRepository,
             disputa_repo: DisputaRepository,
-            max_workers: int = 10
+            max_workers: int = 10,
+            write_batch_size: int = 100,
+            write_flush_ms: int = 500
     ):
         self.dispute_service = dispute_service
         self.invoice_repo = invoice_repo
         self.disputa_repo = disputa_repo
         self.max_workers = max_workers
+        self.write_batch_size = write_batch_size
+        self.write_flush_ms = write_flush_ms
+
+    @staticmethod
+    def _build_disputa_row(invoice_id: int, dispute_id: str, dispute_details: dict, customer_code: str) -> dict:
+        """Extrai TODOS os campos dos detalhes da disputa no formato de DISPUTA_COLUMNS."""
+        # Reason - pode ser objeto ou string
+        dispute_reason_obj = dispute_details.get("disputeReason")
+        if isinstance(dispute_reason_obj, dict):
+            reason_code = dispute_reason_obj.get("reasonCode")
+            reason_description = dispute_reason_obj.get("reasonDescription")
+        elif isinstance(dispute_reason_obj, str):
+            reason_code = None
+            reason_description = dispute_reason_obj
+        else:
+            reason_code = None
+            reason_description = None
+
+        # Agent info
+        agent_obj = dispute_details.get("agent")
+        if isinstance(agent_obj, dict):
+            agent_name = agent_obj.get("name") or agent_obj.get("agentName")
+            agent_email = agent_obj.get("email") or agent_obj.get("agentEmail")
+        else:
+            agent_name = None
+            agent_email = None
+
+        return {
+            "invoice_id": invoice_id,
+            "dispute_number": int(dispute_id),
+            "status": dispute_details.get("statusDescription", "Unknown"),
+            "disputed_amount": dispute_details.get("disputedAmount"),
+            "currency": dispute_details.get("currency"),
+            "reason_code": reason_code,
+            "reason_description": reason_description,
+            "dispute_type": dispute_details.get("disputeType"),
+            "invoice_due_date": dispute_details.get("invoiceDueDate"),
+            "agent_name": agent_name,
+            "agent_email": agent_email,
+            "status_code": dispute_details.get("statusCode"),
+            "api_created_date": dispute_details.get("createdDate"),
+            "api_last_modified": normalize_last_modified(dispute_details.get("lastModifiedDate")),
+            "customer_code": customer_code,
+        }
+
+    @staticmethod
+    def _is_unchanged(dispute: dict, last_modified: dict) -> bool:
+        """True se o lastModifiedDate da listagem é igual ao gravado no banco."""
+        try:
+            dispute_number = int(dispute.get("ohpDisputeId"))
+        except (TypeError, ValueError):
+            return False
+
+        if dispute_number not in last_modified:
+            return False  # disputa nova
+
+        api_value = normalize_last_modified(dispute.get("lastModifiedDate"))
+        db_value = normalize_last_modified(last_modified[dispute_number])
+        return api_value is not None and api_value == db_value
 
-    def _process_single_invoice(self, invoice: dict, dispute_map: dict, customer_code: str) -> dict:
+    def _process_dispute(
+            self,
+            invoice_id: int,
+            numero_invoice: str,
+            dispute: dict,
+            customer_code: str,
+            writer: DisputaBatchWriter
+    ) -> dict:
         """
-        Processa uma única invoice (será executada em paralelo).
+        Processa uma única disputa (será executada em paralelo).
+        A gravação da disputa é feita em lote pelo `writer`.
         """
-        invoice_id = invoice["id"]
-        numero_invoice = invoice["numero_invoice"]
+        dispute_id = dispute.get("ohpDisputeId")
 
         result = {
             "invoice_id": invoice_id,
             "numero_invoice": numero_invoice,
-            "has_dispute": False,
+            "dispute_id": dispute_id,
             "success": False,
             "error": None
         }
 
         try:
-            if numero_invoice in dispute_map:
-                dispute = dispute_map[numero_invoice]
-                dispute_id = dispute.get("ohpDisputeId")
-
-                logger.info(f"Invoice {numero_invoice} tem disputa {dispute_id} (Cliente: {customer_code})")
-
-                # BUSCAR DETALHES COMPLETOS DA DISPUTA
-                dispute_details = self.dispute_service.get_dispute_details(dispute_id, customer_code)
-
-                # DELAY PARA NÃO SOBRECARREGAR A API
-                time.sleep(0.5)
-
-                if dispute_details:
-                    # Extrair TODOS os campos disponíveis
-                    status = dispute_details.get("statusDescription", "Unknown")
-                    disputed_amount = dispute_details.get("disputedAmount")
-                    currency = dispute_details.get("currency")
-                    api_created_date = dispute_details.get("createdDate")
-                    api_last_modified = dispute_details.get("lastModifiedDate")
-
-                    # Dispute Type
-                    dispute_type = dispute_details.get("disputeType")
-
-                    # Invoice Due Date
-                    invoice_due_date = dispute_details.get("invoiceDueDate")
-
-                    # Status Code
-                    status_code = dispute_details.get("statusCode")
-
-                    # Reason - pode ser objeto ou string
-                    dispute_reason_obj = dispute_details.get("disputeReason")
-                    if isinstance(dispute_reason_obj, dict):
-                        reason_code = dispute_reason_obj.get("reasonCode")
-                        reason_description = dispute_reason_obj.get("reasonDescription")
-                    elif isinstance(dispute_reason_obj, str):
-                        reason_code = None
-                        reason_description = dispute_reason_obj
-                    else:
-                        reason_code = None
-                        reason_description = None
-
-                    # Agent info
-                    agent_obj = dispute_details.get("agent")
-                    if isinstance(agent_obj, dict):
-                        agent_name = agent_obj.get("name") or agent_obj.get("agentName")
-                        agent_email = agent_obj.get("email") or agent_obj.get("agentEmail")
-                    else:
-                        agent_name = None
-                        agent_email = None
-
-                    # Salvar COM TODOS OS CAMPOS
-                    self.disputa_repo.insert_or_update(
-                        invoice_id=invoice_id,
-                        dispute_number=int(dispute_id),
-                        status=status,
-                        disputed_amount=disputed_amount,
-                        currency=currency,
-                        reason_code=reason_code,
-                        reason_description=reason_description,
-                        dispute_type=dispute_type,
-                        invoice_due_date=invoice_due_date,
-                        agent_name=agent_name,
-                        agent_email=agent_email,
-                        status_code=status_code,
-                        api_created_date=api_created_date,
-                        api_last_modified=api_last_modified,
-                        customer_code=customer_code
-                    )
-
-                    result["has_dispute"] = True
-                    result["success"] = True
-                    result["dispute_id"] = dispute_id
-                    result["status"] = status
-                else:
-                    logger.warning(f"Nao conseguiu buscar detalhes da disputa {dispute_id}")
-                    result["error"] = "Failed to get dispute details"
-            else:
-                logger.info(f"Invoice {numero_invoice} sem disputa no cliente {customer_code}")
+            logger.info(f"Invoice {numero_invoice} tem disputa {dispute_id} (Cliente: {customer_code})")
+
+            # BUSCAR DETALHES COMPLETOS DA DISPUTA
+            # (o ritmo das chamadas é controlado pelo rate limiter do DisputeService)
+            dispute_details = self.dispute_service.get_dispute_details(dispute_id, customer_code)
+
+            if dispute_details:
+                # Enfileira para gravação em lote (write-behind)
+                row = self._build_disputa_row(invoice_id, dispute_id, dispute_details, customer_code)
+                writer.put(row)
+
                 result["success"] = True
+                result["status"] = row["status"]
+            else:
+                logger.warning(f"Nao conseguiu buscar detalhes da disputa {dispute_id}")
+                result["error"] = "Failed to get dispute details"
 
         except Exception as e:
             logger.error(f"Erro ao processar invoice {numero_invoice}: {e}")
@@ -124,85 +131,136 @@ class DisputeSyncServiceParallel:
 
         return result
 
-    def sync_disputes_parallel(self, customer_code: str, limit: int = 20):
+    def sync_disputes_parallel(
+            self,
+            customer_code: str,
+            limit: int = 20,
+            snapshot: DisputeSnapshot = None,
+            incremental: bool = False
+    ):
         """
         Sincroniza disputas EM PARALELO.
+
+        O trabalho parte das disputas da API (não das invoices do banco):
+        os ids das invoices em disputa são resolvidos numa única consulta
+        e só disputas reais viram tarefas. `limit` é o máximo de disputas
+        processadas.
+
+        Se `snapshot` for informado, usa as disputas já listadas nesta execução.
+        Com `incremental=True`, só consulta detalhes de disputas novas ou cujo
+        lastModifiedDate na listagem mudou em relação ao banco.
         """
         logger.info(f"Iniciando sincronizacao PARALELA de disputas para {customer_code}")
         logger.info(f"Usando {self.max_workers} threads simultaneas")
 
-        # 1. Buscar TODAS as disputas da API
-        logger.info("Buscando todas as disputas da API...")
-        all_disputes = self.dispute_service.list_all_disputes(customer_code)
+        # 1. Buscar TODAS as disputas da API (ou reaproveitar o snapshot)
+        if snapshot is None:
+            logger.info("Buscando todas as disputas da API...")
+            snapshot = DisputeSnapshot.fetch(self.dispute_service, customer_code)
 
-        if not all_disputes:
+        if not snapshot:
             logger.warning("Nenhuma disputa encontrada na API")
             return {"erro": "Nenhuma disputa na API"}
 
-        logger.info(f"Encontradas {len(all_disputes)} disputas na API")
+        logger.info(f"Encontradas {snapshot.total_disputes} disputas na API")
 
-        # 2. Criar mapa: invoiceNumber -> dispute
-        dispute_map = {}
-        for dispute in all_disputes:
-            invoice_num = dispute.get("invoiceNumber")
-            if invoice_num:
-                dispute_map[invoice_num] = dispute
+        # 2. Mapa: invoiceNumber -> dispute
+        dispute_map = snapshot.dispute_map
 
         logger.info(f"Mapa criado com {len(dispute_map)} invoices unicas")
 
-        # 3. Buscar invoices MAERSK do banco
-        invoices = self.invoice_repo.fetch_invoices_by_customer(customer_code, limit=limit)
-        logger.info(f"Encontradas {len(invoices)} invoices no banco")
+        # 3. Resolver ids das invoices em disputa (1 query: numero_invoice IN (...))
+        invoice_ids = self.invoice_repo.get_invoice_ids_by_numbers(
+            list(dispute_map), customer_code=customer_code
+        )
+        logger.info(f"{len(invoice_ids)} invoices com disputa encontradas no banco")
 
-        if not invoices:
-            logger.warning("Nenhuma invoice encontrada no banco")
+        if not invoice_ids:
+            logger.warning("Nenhuma invoice com disputa encontrada no banco")
             return {"erro": "Nenhuma invoice no banco"}
 
         stats = {
-            "total_invoices": len(invoices),
+            "total_invoices": len(invoice_ids),
             "com_disputa": 0,
-            "sem_disputa": 0,
+            "sem_invoice": len(dispute_map) - len(invoice_ids),
+            "inalteradas": 0,
             "disputas_salvas": 0,
             "erros": 0
         }
 
-        # 4. PROCESSAR EM PARALELO
-        logger.info(f"Processando {len(invoices)} invoices em paralelo...")
+        # Modo incremental: lastModifiedDate gravado de cada disputa do cliente
+        last_modified = None
+        if incremental:
+            last_modified = self.disputa_repo.get_last_modified_map(customer_code)
+            logger.info(f"Modo incremental: {len(last_modified)} disputas ja gravadas no banco")
+
+        # 4. Montar tarefas só para disputas reais (e alteradas, no modo incremental)
+        tasks = []
+        unchanged = []
+        for numero_invoice, invoice_id in list(invoice_ids.items())[:limit]:
+            dispute = dispute_map[numero_invoice]
+            if last_modified is not None and self._is_unchanged(dispute, last_modified):
+                unchanged.append(int(dispute["ohpDisputeId"]))
+            else:
+                tasks.append((invoice_id, numero_invoice, dispute))
 
-        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+        stats["inalteradas"] = len(unchanged)
+
+        # 5. PROCESSAR EM PARALELO
+        logger.info(f"Processando {len(tasks)} disputas em paralelo...")
+
+        writer = DisputaBatchWriter(
+            self.disputa_repo,
+            batch_size=self.write_batch_size,
+            flush_interval_ms=self.write_flush_ms
+        )
+
+        with writer, ThreadPoolExecutor(max_workers=self.max_workers) as executor:
             # Submeter todas as tarefas
-            futures = {
+            futures = [
                 executor.submit(
-                    self._process_single_invoice,
-                    invoice,
-                    dispute_map,
-                    customer_code
-                ): invoice for invoice in invoices
-            }
+                    self._process_dispute,
+                    invoice_id,
+                    numero_invoice,
+                    dispute,
+                    customer_code,
+                    writer
+                ) for invoice_id, numero_invoice, dispute in tasks
+            ]
 
             # Processar resultados conforme completam
             for future in as_completed(futures):
                 result = future.result()
 
                 if result["success"]:
-                    if result["has_dispute"]:
-                        stats["com_disputa"] += 1
-                        stats["disputas_salvas"] += 1
-                    else:
-                        stats["sem_disputa"] += 1
+                    stats["com_disputa"] += 1
                 else:
                     stats["erros"] += 1
                     logger.error(f"Erro: {result['error']}")
 
+        # Writer encerrado: tudo que foi enfileirado já está gravado
+        stats["disputas_salvas"] = writer.saved
+        stats["erros"] += writer.errors
+
+        # Disputas sem alteração: marca como verificadas para não voltarem
+        # como "desatualizadas" na etapa de atualização
+        if unchanged:
+            try:
+                self.disputa_repo.touch_many(unchanged, customer_code)
+            except Exception as e:
+                logger.error(f"Erro ao marcar disputas inalteradas: {e}")
+
         # Retornar status
         logger.info("=" * 80)
         logger.info("SINCRONIZACAO PARALELA CONCLUIDA")
         logger.info("=" * 80)
-        logger.info(f"Total de invoices: {stats['total_invoices']}")
-        logger.info(f"Com disputa: {stats['com_disputa']}")
-        logger.info(f"Sem disputa: {stats['sem_disputa']}")
+        logger.info(f"Invoices com disputa no banco: {stats['total_invoices']}")
+        logger.info(f"Disputas sem invoice no banco: {stats['sem_invoice']}")
+        logger.info(f"Disputas consultadas: {stats['com_disputa']}")
+        if incremental:
+            logger.info(f"Inalteradas (detalhes nao consultados): {stats['inalteradas']}")
         logger.info(f"Disputas salvas: {stats['disputas_salvas']}")
         logger.info(f"Erros: {stats['erros']}")
         logger.info("=" * 80)
 
-        return stats
\ No newline at end of file
+        return stats
@@ -0,0 +1,110 @@
+import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from api_maersk.config.settings import INVOICE_TYPE_STATS_FILE
+from api_maersk.services.dispute_service import DisputeService
+from api_maersk.utils.logger import setup_logger
+
+logger = setup_logger(__name__)
+
+# Ordem padrão (usada enquanto não há estatística para o cliente)
+INVOICE_TYPES = ("PAID", "OPEN", "OVERDUE", "DISPUTED", "CREDIT", "DEBIT")
+
+
+class InvoiceTypeProbe:
+    """
+    Descobre em qual `invoiceType` do endpoint /invoices uma invoice está.
+
+    Guarda, por cliente, quantas vezes cada tipo encontrou a invoice e
+    tenta primeiro o tipo mais frequente. Se errar, consulta os tipos
+    restantes em paralelo. As estatísticas são salvas em arquivo e
+    reaproveitadas nas próximas execuções.
+    """
+
+    def __init__(self, dispute_service: DisputeService, stats_file: Path = INVOICE_TYPE_STATS_FILE):
+        self.dispute_service = dispute_service
+        self.stats_file = stats_file
+        self._lock = threading.Lock()
+        self._stats: Dict[str, Dict[str, int]] = self._load_stats()
+
+    def _load_stats(self) -> Dict[str, Dict[str, int]]:
+        if not self.stats_file.exists():
+            return {}
+
+        try:
+            with open(self.stats_file, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except Exception as e:
+            logger.warning(f"Estatísticas de invoiceType ignoradas ({self.stats_file}): {e}")
+            return {}
+
+    def save(self) -> None:
+        """
+        Salva as estatísticas de acerto em arquivo.
+        O lock cobre também a escrita: o probe é compartilhado entre clientes
+        processados em paralelo e todos usam o mesmo arquivo temporário.
+        """
+        with self._lock:
+            stats = json.dumps(self._stats, indent=2)
+
+            self.stats_file.parent.mkdir(parents=True, exist_ok=True)
+            tmp_file = self.stats_file.with_suffix(".tmp")
+            tmp_file.write_text(stats, encoding="utf-8")
+            tmp_file.replace(self.stats_file)
+
+    def ordered_types(self, customer_code: str) -> List[str]:
+        """Tipos do mais para o menos frequente no cliente (empate: ordem padrão)."""
+        with self._lock:
+            hits = dict(self._stats.get(customer_code, {}))
+        return sorted(INVOICE_TYPES, key=lambda t: -hits.get(t, 0))
+
+    def _record_hit(self, customer_code: str, invoice_type: str) -> None:
+        with self._lock:
+            customer_stats = self._stats.setdefault(customer_code, {})
+            customer_stats[invoice_type] = customer_stats.get(invoice_type, 0) + 1
+
+    def find_many(self, invoice_numbers: List[str], customer_code: str) -> Dict[str, Tuple[Dict, str]]:
+        """
+        Busca várias invoices na API, em lote (vários ids por requisição).
+        Retorna {numero_invoice: (invoice, invoiceType)} só com as encontradas.
+        """
+        first, *rest = self.ordered_types(customer_code)
+        found: Dict[str, Tuple[Dict, str]] = {}
+
+        for number, invoice in self.dispute_service.get_invoices_info(
+                invoice_numbers, customer_code, invoice_type=first
+        ).items():
+            found[number] = (invoice, first)
+            self._record_hit(customer_code, first)
+
+        pending = [str(n) for n in invoice_numbers if str(n) not in found]
+        if not pending:
+            return found
+
+        # Não encontradas no tipo mais provável: consulta os demais tipos ao mesmo tempo
+        with ThreadPoolExecutor(max_workers=len(rest)) as executor:
+            results = list(executor.map(
+                lambda invoice_type: self.dispute_service.get_invoices_info(
+                    pending, customer_code, invoice_type=invoice_type
+                ),
+                rest
+            ))
+
+        # Se mais de um tipo encontrar, prevalece o mais frequente
+        for invoice_type, invoices in zip(rest, results):
+            for number, invoice in invoices.items():
+                if number not in found:
+                    found[number] = (invoice, invoice_type)
+                    self._record_hit(customer_code, invoice_type)
+
+        return found
+
+    def find(self, invoice_number: str, customer_code: str) -> Tuple[Optional[Dict], Optional[str]]:
+        """
+        Busca uma invoice na API.
+        Retorna (invoice, invoiceType) ou (None, None).
+        """
+        return self.find_many([invoice_number], customer_code).get(str(invoice_number), (None, None))
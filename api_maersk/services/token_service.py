@@ -1,21 +1,57 @@
 import json
+import threading
+import time
 import jwt
-from datetime import datetime
-from typing import Dict, Optional
+from datetime import datetime, timedelta
+from functools import lru_cache
+from typing import Dict, List, Optional
 from pathlib import Path
 
-from api_maersk.config.settings import TOKENS_FILE, CUSTOMER_CODE_MAPPING
+from api_maersk.config.settings import TOKENS_FILE, CUSTOMER_CODE_MAPPING, TOKEN_REFRESH_WINDOW_MINUTES
 from api_maersk.utils.logger import setup_logger
 
 logger = setup_logger(__name__)
 
 
+@lru_cache(maxsize=256)
+def _decode_exp(token: str) -> Optional[float]:
+    """
+    Claim `exp` do JWT, decodificado uma única vez por token.
+    O token não muda depois de emitido, então o resultado pode ser memorizado.
+    """
+    return jwt.decode(token, options={"verify_signature": False}).get("exp")
+
+
+class _RefreshFlight:
+    """
+    Estado de renovação compartilhado por arquivo de tokens (conjunto de
+    customers): o lock da renovação, os tokens da última renovação e
+    quando a última tentativa falhou (monotonic).
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.tokens: Dict = {}
+        self.failed_at: Optional[float] = None
+
+
+_flights: Dict[str, _RefreshFlight] = {}
+_flights_lock = threading.Lock()
+
+
+def _flight_for(tokens_file: Path) -> _RefreshFlight:
+    key = str(Path(tokens_file).resolve())
+    with _flights_lock:
+        return _flights.setdefault(key, _RefreshFlight())
+
+
 class TokenService:
     """Serviço para gerenciamento de tokens de autenticação."""
 
     def __init__(self, tokens_file: Path = TOKENS_FILE):
         self.tokens_file = tokens_file
         self._tokens_cache: Dict = {}
+        self._flight = _flight_for(tokens_file)
 
     def load_tokens(self) -> Dict:
         """Carrega tokens do arquivo."""
@@ -39,28 +75,33 @@ class TokenService:
         self._tokens_cache = tokens
         logger.info(f"Salvos {len(tokens)} tokens em {self.tokens_file}")
 
+    @staticmethod
+    def get_token_expiration(token: str) -> Optional[datetime]:
+        """Lê o claim `exp` do JWT (sem validar assinatura). None se não houver."""
+        exp = _decode_exp(token)
+        return datetime.fromtimestamp(exp) if exp else None
+
     def is_token_valid(self, token: str) -> bool:
-        """Verifica se o token está válido (não expirado)."""
+        """
+        Verifica se o token está válido (não expirado).
+        Chamado antes de cada requisição: o `exp` vem do cache e só
+        falhas geram log.
+        """
         try:
-            decoded = jwt.decode(token, options={"verify_signature": False})
-            exp = decoded.get("exp")
+            exp = _decode_exp(token)
 
             if not exp:
                 logger.warning("Token sem campo 'exp'")
                 return False
 
-            expiration = datetime.fromtimestamp(exp)
-            now = datetime.now()
+            time_left = exp - time.time()
 
-            is_valid = expiration > now
-
-            if is_valid:
-                time_left = (expiration - now).total_seconds() / 3600
-                logger.info(f"Token válido. Expira em {time_left:.1f} horas")
-            else:
-                logger.warning(f"Token expirado em {expiration}")
+            if time_left > 0:
+                logger.debug(f"Token válido. Expira em {time_left / 3600:.1f} horas")
+                return True
 
-            return is_valid
+            logger.warning(f"Token expirado em {datetime.fromtimestamp(exp)}")
+            return False
 
         except jwt.DecodeError as e:
             logger.error(f"Erro ao decodificar token: {e}")
@@ -143,7 +184,13 @@ class TokenService:
             # 5. Retorna token (se válido)
             return token
 
-        # 3. Token expirado, precisa renovar
+        # 3. Outra instância/processo pode já ter renovado: relê o arquivo
+        self.load_tokens()
+        fresh_token = self._tokens_cache.get(customer_code, {}).get("id_token")
+        if fresh_token and fresh_token != token and self.is_token_valid(fresh_token):
+            return fresh_token
+
+        # Token expirado, precisa renovar
         logger.warning(f"Token expirado para {customer_code}")
 
         if not auth_service:
@@ -151,19 +198,114 @@ class TokenService:
             logger.info("Execute: py tests\\test_auth.py para renovar manualmente")
             return None
 
-        # Renova token
-        logger.info("Renovando token automaticamente...")
-        new_token = auth_service.refresh_single_token(customer_code)
+        # Renova token (a menos que outra thread já tenha trocado este)
+        all_tokens = self.refresh_tokens(auth_service, customer_code, token)
+        new_token = all_tokens.get(customer_code, {}).get("id_token")
 
         if new_token:
-            # 4. Salva no arquivo
-            self.update_token(customer_code, new_token)
             # 5. Retorna token novo
             return new_token
 
         logger.error("Falha ao renovar token")
         return None
 
+    def _replaced_tokens(self, customer_code: str, failed_token: Optional[str]) -> Optional[Dict]:
+        """
+        Tokens (da última renovação ou do arquivo) em que o token do customer
+        já é outro que não `failed_token`, e válido. None se ainda é preciso renovar.
+        """
+        for tokens in (self._flight.tokens, self.load_tokens()):
+            token = tokens.get(customer_code, {}).get("id_token")
+            if token and token != failed_token and self.is_token_valid(token):
+                self._tokens_cache = dict(tokens)
+                return tokens
+        return None
+
+    def refresh_tokens(
+            self, auth_service, customer_code: Optional[str] = None, failed_token: Optional[str] = None
+    ) -> Dict:
+        """
+        Renova os tokens de todos os customers (uma sessão do browser).
+
+        Single-flight: se várias threads pedirem a renovação ao mesmo
+        tempo, só a primeira abre o browser. Com `customer_code`, a decisão
+        é tomada dentro do lock comparando com o token que falhou para quem
+        chamou (`failed_token`): se outra thread/processo já o trocou por um
+        válido, reaproveita o resultado em vez de abrir o browser de novo.
+        """
+        flight = self._flight
+        requested_at = time.monotonic()
+
+        with flight.lock:
+            if customer_code is not None:
+                tokens = self._replaced_tokens(customer_code, failed_token)
+                if tokens is not None:
+                    logger.info("Tokens já renovados por outra thread")
+                    return tokens
+
+            # Uma renovação terminou (com falha) enquanto esperávamos: não repete
+            if flight.failed_at is not None and flight.failed_at > requested_at:
+                logger.warning("Renovação de tokens acabou de falhar em outra thread")
+                return {}
+
+            logger.info("Renovando tokens automaticamente...")
+            try:
+                all_tokens = auth_service.refresh_all_tokens() or {}
+            except Exception as e:
+                logger.error(f"Erro na renovação de tokens: {e}")
+                all_tokens = {}
+
+            if all_tokens:
+                self._tokens_cache = all_tokens
+                flight.tokens = all_tokens
+                flight.failed_at = None
+            else:
+                flight.failed_at = time.monotonic()
+            return all_tokens
+
+    def tokens_expiring_within(self, minutes: int = TOKEN_REFRESH_WINDOW_MINUTES) -> List[str]:
+        """
+        Customers cujo token falta, é inválido ou expira nos próximos `minutes`.
+        Considera os customers do arquivo de tokens e os do CUSTOMER_CODE_MAPPING.
+        """
+        tokens = self.load_tokens()
+        limit = datetime.now() + timedelta(minutes=minutes)
+        expiring = []
+
+        for customer_code in dict.fromkeys([*CUSTOMER_CODE_MAPPING, *tokens]):
+            token = tokens.get(customer_code, {}).get("id_token")
+            try:
+                expiration = self.get_token_expiration(token) if token else None
+            except jwt.DecodeError:
+                expiration = None
+
+            if not expiration or expiration <= limit:
+                expiring.append(customer_code)
+
+        return expiring
+
+    def ensure_fresh_tokens(self, auth_service, minutes: int = TOKEN_REFRESH_WINDOW_MINUTES) -> bool:
+        """
+        Renovação antecipada (antes da execução): se algum token expira
+        nos próximos `minutes`, renova TODOS numa única sessão do browser,
+        para que nenhuma sincronização pare no meio esperando login.
+
+        Returns:
+            False se a renovação era necessária e falhou
+        """
+        expiring = self.tokens_expiring_within(minutes)
+        if not expiring:
+            logger.info(f"Todos os tokens válidos por mais de {minutes} min")
+            return True
+
+        logger.info(f"Tokens expirando em até {minutes} min: {', '.join(expiring)}. Renovando todos...")
+        all_tokens = self.refresh_tokens(auth_service)
+
+        missing = [code for code in expiring if code not in all_tokens]
+        if missing:
+            logger.warning(f"Tokens não renovados: {', '.join(missing)}")
+        return bool(all_tokens)
+
     def get_all_customers(self) -> Dict:
         """Retorna todos os customers disponíveis."""
         if not self._tokens_cache:
@@ -0,0 +1,17 @@
+"""
+Configuração dos testes unitários (pytest).
+
+settings.py exige credenciais do banco no import; os testes unitários não
+acessam o banco, então valores fictícios bastam quando não há .env.
+"""
+
+import os
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent.parent))
+
+os.environ.setdefault("DB_HOST", "localhost")
+os.environ.setdefault("DB_NAME", "feat_pc")
+os.environ.setdefault("DB_USER", "root")
+os.environ.setdefault("DB_PASSWORD", "unit-tests")
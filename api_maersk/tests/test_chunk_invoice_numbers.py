@@ -0,0 +1,56 @@
+"""
+TESTE: DisputeService._chunk_invoice_numbers
+Objetivo: lotes de ids=A,B,C sem passar do limite de tamanho da URL
+"""
+
+from api_maersk.config.settings import API_BASE_URL
+from api_maersk.services.dispute_service import DisputeService
+from api_maersk.utils.rate_limiter import AdaptiveRateLimiter
+
+API_CODE = "30500000000"
+INVOICE_TYPE = "OPEN"
+
+
+def _service() -> DisputeService:
+    return DisputeService(token_service=None, auth_service=None, rate_limiter=AdaptiveRateLimiter(1))
+
+
+def _url_length(chunk) -> int:
+    return len(API_BASE_URL) + len(DisputeService._invoices_endpoint(",".join(chunk), API_CODE, INVOICE_TYPE))
+
+
+def _chunks(numbers, max_url_length):
+    return list(_service()._chunk_invoice_numbers(numbers, API_CODE, INVOICE_TYPE, max_url_length))
+
+
+def test_lista_vazia():
+    assert _chunks([], 2000) == []
+
+
+def test_tudo_cabe_em_um_lote():
+    numbers = [f"{7000000 + i}" for i in range(10)]
+    assert _chunks(numbers, 2000) == [numbers]
+
+
+def test_nenhum_lote_passa_do_limite_e_ordem_mantida():
+    numbers = [f"{7000000 + i}" for i in range(500)]
+    max_url_length = _url_length(numbers[:7])  # cabem exatamente 7 por lote
+
+    chunks = _chunks(numbers, max_url_length)
+
+    assert [n for chunk in chunks for n in chunk] == numbers
+    assert all(_url_length(chunk) <= max_url_length for chunk in chunks)
+    assert [len(chunk) for chunk in chunks[:-1]] == [7] * (len(chunks) - 1)
+
+
+def test_limite_exato_inclui_a_virgula():
+    numbers = ["1111111", "2222222"]
+    exato = _url_length(numbers)
+    assert _chunks(numbers, exato) == [numbers]
+    assert _chunks(numbers, exato - 1) == [["1111111"], ["2222222"]]
+
+
+def test_numero_maior_que_o_limite_vai_sozinho():
+    numbers = ["1", "9" * 100, "2"]
+    max_url_length = _url_length(["1", "2"])
+    assert _chunks(numbers, max_url_length) == [["1"], ["9" * 100], ["2"]]
@@ -0,0 +1,26 @@
+"""
+TESTE: InvoiceTypeProbe.save
+Objetivo: saves simultâneos (clientes em paralelo) não corrompem o arquivo
+"""
+
+import json
+from concurrent.futures import ThreadPoolExecutor
+
+from api_maersk.services.invoice_type_probe import InvoiceTypeProbe
+
+
+def test_saves_simultaneos_geram_json_valido(tmp_path):
+    stats_file = tmp_path / "invoice_type_stats.json"
+    probe = InvoiceTypeProbe(dispute_service=None, stats_file=stats_file)
+
+    def record_and_save(i):
+        probe._record_hit(f"C{i % 5}", "OPEN")
+        probe.save()
+
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        list(executor.map(record_and_save, range(200)))
+
+    saved = json.loads(stats_file.read_text(encoding="utf-8"))
+    assert sum(c["OPEN"] for c in saved.values()) == 200
+    assert not stats_file.with_suffix(".tmp").exists()
+    assert InvoiceTypeProbe(dispute_service=None, stats_file=stats_file)._stats == saved
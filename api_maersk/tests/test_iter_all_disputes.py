@@ -0,0 +1,61 @@
+"""
+TESTE: DisputeService.iter_all_disputes
+Objetivo: página com falha interrompe a listagem com erro (nunca lista parcial)
+"""
+
+import pytest
+
+from api_maersk.services.dispute_service import DisputeListingError, DisputeService
+from api_maersk.utils.rate_limiter import AdaptiveRateLimiter
+
+
+class PagedDisputeService(DisputeService):
+    """DisputeService com páginas pré-definidas (None = página com falha)."""
+
+    def __init__(self, pages, total=None):
+        super().__init__(token_service=None, auth_service=None, rate_limiter=AdaptiveRateLimiter(100, 100))
+        self.pages = pages
+        self.total = total
+
+    def _get_token_and_api_code(self, customer_code):
+        return "API", "token"
+
+    def _fetch_disputes_page(self, token, api_code, page_no, page_size, token_customer=None):
+        records = self.pages[page_no]
+        if records is None:
+            return None
+        data = {"search_records": records}
+        if self.total is not None:
+            data["total_records"] = self.total
+        return data
+
+
+def _records(start, count):
+    return [{"ohpDisputeId": i} for i in range(start, start + count)]
+
+
+@pytest.mark.parametrize("total", [None, 5])
+def test_lista_todas_as_paginas(total):
+    service = PagedDisputeService([_records(0, 2), _records(2, 2), _records(4, 1)], total=total)
+    disputes = list(service.iter_all_disputes("C", page_size=2, page_workers=2))
+    assert [d["ohpDisputeId"] for d in disputes] == [0, 1, 2, 3, 4]
+
+
+def test_falha_na_primeira_pagina_nao_parece_cliente_sem_disputas():
+    service = PagedDisputeService([None])
+    with pytest.raises(DisputeListingError):
+        service.list_all_disputes("C", page_size=2)
+
+
+@pytest.mark.parametrize("total", [None, 6])
+def test_falha_em_pagina_intermediaria(total):
+    service = PagedDisputeService([_records(0, 2), None, _records(4, 2)], total=total)
+    with pytest.raises(DisputeListingError):
+        service.list_all_disputes("C", page_size=2, page_workers=2)
+
+
+def test_sem_token():
+    service = PagedDisputeService([])
+    service._get_token_and_api_code = lambda customer_code: None
+    with pytest.raises(DisputeListingError):
+        list(service.iter_all_disputes("C"))
@@ -0,0 +1,63 @@
+"""
+TESTE: normalize_last_modified
+Objetivo: mesmo instante em formatos diferentes deve comparar igual (UTC)
+"""
+
+from datetime import datetime, timedelta, timezone
+
+from api_maersk.utils.dates import normalize_last_modified
+
+
+INSTANT = datetime(2024, 3, 10, 14, 30, 15)  # UTC
+EPOCH_MS = int(INSTANT.replace(tzinfo=timezone.utc).timestamp() * 1000)
+
+
+def test_vazio_retorna_none():
+    assert normalize_last_modified(None) is None
+    assert normalize_last_modified("") is None
+    assert normalize_last_modified("não é data") is None
+
+
+def test_formato_ms_em_utc():
+    assert normalize_last_modified(f"/Date({EPOCH_MS})/") == INSTANT
+
+
+def test_iso_com_z_e_fracao():
+    assert normalize_last_modified("2024-03-10T14:30:15.987Z") == INSTANT
+
+
+def test_iso_com_offset_converte_para_utc():
+    assert normalize_last_modified("2024-03-10T11:30:15-03:00") == INSTANT
+
+
+def test_iso_sem_timezone_considerado_utc():
+    assert normalize_last_modified("2024-03-10T14:30:15") == INSTANT
+
+
+def test_datetime_do_banco():
+    assert normalize_last_modified(INSTANT.replace(microsecond=500)) == INSTANT
+    aware = INSTANT.replace(tzinfo=timezone.utc).astimezone(timezone(timedelta(hours=2)))
+    assert normalize_last_modified(aware) == INSTANT
+
+
+def test_formatos_diferentes_mesmo_instante():
+    values = [
+        f"/Date({EPOCH_MS})/",
+        "2024-03-10T14:30:15Z",
+        "2024-03-10T16:30:15+02:00",
+        INSTANT,
+    ]
+    assert len({normalize_last_modified(v) for v in values}) == 1
+
+
+def test_valor_gravado_ja_normalizado():
+    from api_maersk.services.dispute_sync_service_parallel import DisputeSyncServiceParallel
+
+    row = DisputeSyncServiceParallel._build_disputa_row(
+        1, "123", {"lastModifiedDate": "2024-03-10T11:30:15.987-03:00"}, "C1"
+    )
+    assert row["api_last_modified"] == INSTANT
+    assert DisputeSyncServiceParallel._is_unchanged(
+        {"ohpDisputeId": "123", "lastModifiedDate": "2024-03-10T14:30:15.4Z"},
+        {123: row["api_last_modified"]},
+    )
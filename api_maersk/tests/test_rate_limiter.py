@@ -0,0 +1,143 @@
+"""
+TESTE: rate_limiter
+Objetivo: TokenBucket (rajada, espera, validação da taxa), Retry-After
+e ajuste do AdaptiveRateLimiter
+"""
+
+import time
+from datetime import datetime, timedelta, timezone
+from email.utils import format_datetime
+
+import pytest
+
+from api_maersk.utils.rate_limiter import AdaptiveRateLimiter, TokenBucket, parse_retry_after
+
+
+def test_rajada_ate_a_capacidade_sem_esperar():
+    bucket = TokenBucket(rate=1, capacity=5)
+    start = time.monotonic()
+    for _ in range(5):
+        bucket.acquire()
+    assert time.monotonic() - start < 0.1
+
+
+def test_sem_tokens_espera_a_reposicao():
+    bucket = TokenBucket(rate=20, capacity=1)
+    bucket.acquire()
+    start = time.monotonic()
+    bucket.acquire()
+    assert time.monotonic() - start >= 0.04
+
+
+def test_capacidade_padrao():
+    assert TokenBucket(rate=0.5).capacity == 1.0
+    assert TokenBucket(rate=4).capacity == 4
+
+
+def test_pause_bloqueia_pelo_tempo_indicado():
+    bucket = TokenBucket(rate=100, capacity=10)
+    bucket.pause(0.1)
+    start = time.monotonic()
+    bucket.acquire()
+    assert time.monotonic() - start >= 0.09
+
+
+@pytest.mark.parametrize("rate", [0, -1, None])
+def test_taxa_invalida(rate):
+    with pytest.raises(ValueError):
+        TokenBucket(rate=rate)
+
+
+def test_capacidade_invalida():
+    with pytest.raises(ValueError):
+        TokenBucket(rate=1, capacity=0.5)
+
+
+@pytest.mark.parametrize("rate", [0, -2])
+def test_set_rate_invalido_mantem_taxa(rate):
+    bucket = TokenBucket(rate=3)
+    with pytest.raises(ValueError):
+        bucket.set_rate(rate)
+    assert bucket.rate == 3
+
+
+# ----- parse_retry_after -----
+
+@pytest.mark.parametrize("value, expected", [
+    (None, None),
+    ("", None),
+    ("120", 120.0),
+    ("1.5", 1.5),
+    ("-3", 0.0),
+    ("amanhã", None),
+])
+def test_parse_retry_after_segundos(value, expected):
+    assert parse_retry_after(value) == expected
+
+
+def test_parse_retry_after_data_http():
+    when = datetime.now(timezone.utc) + timedelta(seconds=30)
+    seconds = parse_retry_after(format_datetime(when, usegmt=True))
+    assert 28 <= seconds <= 30
+
+
+def test_parse_retry_after_data_no_passado():
+    when = datetime.now(timezone.utc) - timedelta(minutes=5)
+    assert parse_retry_after(format_datetime(when, usegmt=True)) == 0.0
+
+
+# ----- AdaptiveRateLimiter -----
+
+def test_429_reduz_a_taxa_pela_metade_ate_o_minimo():
+    limiter = AdaptiveRateLimiter(rate=4, min_rate=1.5)
+    limiter.on_response("k", 429)
+    assert limiter.rate("k") == 2
+    limiter.on_response("k", 503)
+    assert limiter.rate("k") == 1.5
+
+
+def test_sucessos_seguidos_aumentam_a_taxa_ate_o_maximo():
+    limiter = AdaptiveRateLimiter(rate=2, max_rate=2.5, increase_step=0.5, success_threshold=3)
+    for _ in range(2):
+        limiter.on_response("k", 200)
+    assert limiter.rate("k") == 2
+    limiter.on_response("k", 200)
+    assert limiter.rate("k") == 2.5
+    for _ in range(6):
+        limiter.on_response("k", 200)
+    assert limiter.rate("k") == 2.5
+
+
+def test_erro_zera_a_sequencia_de_sucessos():
+    limiter = AdaptiveRateLimiter(rate=2, max_rate=10, success_threshold=3)
+    limiter.on_response("k", 200)
+    limiter.on_response("k", 200)
+    limiter.on_response("k", 500)
+    limiter.on_response("k", 200)
+    assert limiter.rate("k") == 1
+
+
+def test_chaves_independentes():
+    limiter = AdaptiveRateLimiter(rate=4)
+    limiter.on_response("a", 429)
+    assert limiter.rate("a") == 2
+    assert limiter.rate("b") == 4
+
+
+def test_retry_after_pausa_a_chave():
+    limiter = AdaptiveRateLimiter(rate=100, capacity=10)
+    limiter.on_response("k", 429, retry_after="0.1")
+    start = time.monotonic()
+    limiter.acquire("k")
+    assert time.monotonic() - start >= 0.09
+
+
+@pytest.mark.parametrize("kwargs", [
+    {"rate": 0},
+    {"rate": 4, "capacity": 0},
+    {"rate": 4, "min_rate": 0},
+    {"rate": 4, "max_rate": -1},
+])
+def test_configuracao_invalida(kwargs):
+    with pytest.raises(ValueError):
+        AdaptiveRateLimiter(**kwargs)
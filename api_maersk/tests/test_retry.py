@@ -0,0 +1,161 @@
+"""
+TESTE: RetryPolicy e DisputeService._request
+Objetivo: backoff com jitter, só idempotentes, 401 renova o token uma vez
+"""
+
+import pytest
+import requests
+
+from api_maersk.services import dispute_service as dispute_service_module
+from api_maersk.services.dispute_service import DisputeService
+from api_maersk.utils.rate_limiter import AdaptiveRateLimiter
+from api_maersk.utils.retry import RetryPolicy
+
+
+# ----- RetryPolicy -----
+
+@pytest.mark.parametrize("status", [408, 429, 500, 502, 503, 504])
+def test_status_transitorios_repetem(status):
+    assert RetryPolicy(max_attempts=3).should_retry(1, True, status_code=status)
+
+
+@pytest.mark.parametrize("status", [200, 400, 401, 403, 404])
+def test_status_definitivos_nao_repetem(status):
+    assert not RetryPolicy(max_attempts=3).should_retry(1, True, status_code=status)
+
+
+def test_nao_idempotente_nunca_repete():
+    policy = RetryPolicy(max_attempts=3)
+    assert not policy.should_retry(1, False, status_code=503)
+    assert not policy.should_retry(1, False, error=requests.exceptions.ConnectionError())
+
+
+def test_ultima_tentativa_nao_repete():
+    policy = RetryPolicy(max_attempts=3)
+    assert policy.should_retry(2, True, status_code=503)
+    assert not policy.should_retry(3, True, status_code=503)
+
+
+def test_erros_de_rede():
+    policy = RetryPolicy(max_attempts=3)
+    assert policy.should_retry(1, True, error=requests.exceptions.Timeout())
+    assert policy.should_retry(1, True, error=requests.exceptions.ConnectionError())
+    assert not policy.should_retry(1, True, error=requests.exceptions.InvalidURL())
+
+
+@pytest.mark.parametrize("method, idempotent, expected", [
+    ("GET", None, True),
+    ("get", None, True),
+    ("POST", None, False),
+    ("POST", True, True),
+    ("GET", False, False),
+])
+def test_is_idempotent(method, idempotent, expected):
+    assert RetryPolicy.is_idempotent(method, idempotent) is expected
+
+
+def test_delay_exponencial_com_jitter_e_teto():
+    policy = RetryPolicy(base_delay=1.0, max_delay=5.0)
+    for attempt, full in [(1, 1.0), (2, 2.0), (3, 4.0), (4, 5.0), (10, 5.0)]:
+        for _ in range(20):
+            assert full / 2 <= policy.delay(attempt) <= full
+
+
+def test_delay_respeita_retry_after_limitado_ao_teto():
+    policy = RetryPolicy(base_delay=1.0, max_delay=30.0)
+    assert policy.delay(1, retry_after=12) == 12
+    assert policy.delay(1, retry_after=300) == 30
+
+
+# ----- DisputeService._request -----
+
+class FakeResponse:
+    def __init__(self, status_code, headers=None):
+        self.status_code = status_code
+        self.headers = headers or {}
+
+
+class FakeTokenService:
+    def __init__(self):
+        self.refreshes = 0
+
+    def get_token(self, customer_code):
+        return "velho"
+
+    def is_token_valid(self, token):
+        return True
+
+    def refresh_tokens(self, auth_service, customer_code=None, failed_token=None):
+        self.refreshes += 1
+        return {customer_code: {"id_token": f"novo-{self.refreshes}"}}
+
+
+@pytest.fixture
+def calls(monkeypatch):
+    """Respostas enfileiradas para requests.request; registra os headers enviados."""
+    state = {"responses": [], "headers": []}
+
+    def fake_request(method, url, headers=None, **kwargs):
+        state["headers"].append(dict(headers))
+        response = state["responses"].pop(0)
+        if isinstance(response, Exception):
+            raise response
+        return response
+
+    monkeypatch.setattr(dispute_service_module.requests, "request", fake_request)
+    monkeypatch.setattr(dispute_service_module.time, "sleep", lambda seconds: None)
+    return state
+
+
+def _service(token_service=None):
+    return DisputeService(
+        token_service=token_service or FakeTokenService(),
+        auth_service=object(),
+        rate_limiter=AdaptiveRateLimiter(1000, 1000),
+        retry_policy=RetryPolicy(max_attempts=3, base_delay=0),
+    )
+
+
+def test_get_repete_ate_sucesso(calls):
+    calls["responses"] = [FakeResponse(503), requests.exceptions.Timeout(), FakeResponse(200)]
+    response = _service()._request("GET", "https://api.test/x", {"Authorization": "Bearer velho"})
+    assert response.status_code == 200
+    assert len(calls["headers"]) == 3
+
+
+def test_get_devolve_ultima_resposta_apos_esgotar(calls):
+    calls["responses"] = [FakeResponse(503)] * 3
+    response = _service()._request("GET", "https://api.test/x", {})
+    assert response.status_code == 503
+
+
+def test_erro_de_rede_na_ultima_tentativa_propaga(calls):
+    calls["responses"] = [requests.exceptions.ConnectionError()] * 3
+    with pytest.raises(requests.exceptions.ConnectionError):
+        _service()._request("GET", "https://api.test/x", {})
+
+
+def test_post_nao_idempotente_nao_repete(calls):
+    calls["responses"] = [FakeResponse(503)]
+    response = _service()._request("POST", "https://api.test/x", {})
+    assert response.status_code == 503
+    assert len(calls["headers"]) == 1
+
+
+def test_401_renova_token_uma_vez(calls):
+    token_service = FakeTokenService()
+    calls["responses"] = [FakeResponse(401), FakeResponse(401)]
+    response = _service(token_service)._request(
+        "GET", "https://api.test/x", {"Authorization": "Bearer velho"}, customer_code="C"
+    )
+    assert response.status_code == 401
+    assert token_service.refreshes == 1
+    assert [h["Authorization"] for h in calls["headers"]] == ["Bearer velho", "Bearer novo-1"]
+
+
+def test_401_sem_customer_code_nao_renova(calls):
+    token_service = FakeTokenService()
+    calls["responses"] = [FakeResponse(401)]
+    response = _service(token_service)._request("GET", "https://api.test/x", {"Authorization": "Bearer velho"})
+    assert response.status_code == 401
+    assert token_service.refreshes == 0
@@ -0,0 +1,94 @@
+"""
+TESTE: TokenService.refresh_tokens
+Objetivo: renovação single-flight (um único login para várias threads)
+"""
+
+import threading
+import time
+
+import jwt
+
+from api_maersk.services.token_service import TokenService
+
+
+def _jwt(exp_offset: float, nonce: str) -> str:
+    return jwt.encode({"exp": int(time.time() + exp_offset), "n": nonce}, "chave-de-teste-com-mais-de-32-bytes", algorithm="HS256")
+
+
+class FakeAuthService:
+    """Conta os logins; cada login devolve um token novo para o customer C."""
+
+    def __init__(self, delay: float = 0.0, fail: bool = False):
+        self.calls = 0
+        self.delay = delay
+        self.fail = fail
+
+    def refresh_all_tokens(self):
+        self.calls += 1
+        time.sleep(self.delay)
+        if self.fail:
+            return {}
+        return {"C": {"id_token": _jwt(3600, f"login-{self.calls}")}}
+
+
+def test_thread_atrasada_reaproveita_renovacao(tmp_path):
+    tokens_file = tmp_path / "tokens.json"
+    failed = _jwt(-60, "expirado")
+    auth = FakeAuthService()
+
+    first = TokenService(tokens_file).refresh_tokens(auth, "C", failed)
+    # Outra thread viu o mesmo token falhar, mas só chega ao lock depois
+    second = TokenService(tokens_file).refresh_tokens(auth, "C", failed)
+
+    assert auth.calls == 1
+    assert second["C"]["id_token"] == first["C"]["id_token"]
+
+
+def test_threads_simultaneas_fazem_um_login(tmp_path):
+    tokens_file = tmp_path / "tokens.json"
+    failed = _jwt(-60, "expirado")
+    auth = FakeAuthService(delay=0.2)
+    results = []
+
+    def worker():
+        results.append(TokenService(tokens_file).refresh_tokens(auth, "C", failed))
+
+    threads = [threading.Thread(target=worker) for _ in range(5)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert auth.calls == 1
+    assert len({r["C"]["id_token"] for r in results}) == 1
+
+
+def test_token_novo_recusado_renova_de_novo(tmp_path):
+    tokens_file = tmp_path / "tokens.json"
+    auth = FakeAuthService()
+    service = TokenService(tokens_file)
+
+    first = service.refresh_tokens(auth, "C", _jwt(-60, "expirado"))
+    # O token renovado também foi recusado (401): precisa de outro login
+    service.refresh_tokens(auth, "C", first["C"]["id_token"])
+
+    assert auth.calls == 2
+
+
+def test_falha_nao_repete_login_para_quem_esperava(tmp_path):
+    tokens_file = tmp_path / "tokens.json"
+    failed = _jwt(-60, "expirado")
+    auth = FakeAuthService(delay=0.2, fail=True)
+    results = []
+
+    def worker():
+        results.append(TokenService(tokens_file).refresh_tokens(auth, "C", failed))
+
+    threads = [threading.Thread(target=worker) for _ in range(3)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert auth.calls == 1
+    assert results == [{}, {}, {}]
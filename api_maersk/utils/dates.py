@@ -0,0 +1,38 @@
+import re
+from datetime import datetime, timezone
+from typing import Optional
+
+
+def normalize_last_modified(value) -> Optional[datetime]:
+    """
+    Normaliza o lastModifiedDate (da API ou do banco): datetime em UTC sem
+    timezone, truncado em segundos. None se não reconhecer.
+    É o valor gravado em `disputa.api_last_modified` e o usado na comparação
+    do sync incremental, para que o MySQL não converta o offset para o fuso
+    da sessão nem arredonde as frações de segundo.
+    Aceita datetime, ISO 8601 (com 'Z'/offset/frações) e '/Date(ms)/'.
+    Valores sem timezone são considerados UTC.
+    """
+    if value is None or value == "":
+        return None
+
+    if isinstance(value, datetime):
+        dt = value
+    else:
+        text = str(value).strip()
+        match = re.search(r'/Date\((\d+)\)/', text)
+        if match:
+            dt = datetime.fromtimestamp(int(match.group(1)) / 1000, tz=timezone.utc)
+        else:
+            try:
+                dt = datetime.fromisoformat(text.replace("Z", "+00:00"))
+            except ValueError:
+                try:
+                    dt = datetime.fromisoformat(text[:19])
+                except ValueError:
+                    return None
+
+    if dt.tzinfo is not None:
+        dt = dt.astimezone(timezone.utc)
+
+    return dt.replace(tzinfo=None, microsecond=0)
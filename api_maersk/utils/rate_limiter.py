@@ -0,0 +1,153 @@
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from typing import Dict, Optional
+
+
+def _check_rate(rate: float, capacity: float = None) -> None:
+    """Taxa <= 0 faria acquire() dividir por zero ou esperar para sempre."""
+    if not rate or rate <= 0:
+        raise ValueError(f"Taxa do rate limiter deve ser > 0 (recebido: {rate})")
+    if capacity is not None and capacity < 1:
+        raise ValueError(f"Capacidade (burst) do rate limiter deve ser >= 1 (recebido: {capacity})")
+
+
+class TokenBucket:
+    """
+    Rate limiter (token bucket) thread-safe.
+    Libera em média `rate` requisições por segundo, com rajadas de até `capacity`.
+    """
+
+    def __init__(self, rate: float, capacity: float = None):
+        _check_rate(rate, capacity)
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(1.0, rate)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def acquire(self) -> None:
+        """Bloqueia até haver um token disponível e o consome."""
+        while True:
+            with self._lock:
+                self._refill()
+                now = time.monotonic()
+                if now < self._paused_until:
+                    wait = self._paused_until - now
+                elif self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                else:
+                    wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+    def set_rate(self, rate: float) -> None:
+        """Altera a taxa (os tokens acumulados até agora usam a taxa antiga)."""
+        _check_rate(rate)
+        with self._lock:
+            self._refill()
+            self.rate = rate
+
+    def pause(self, seconds: float) -> None:
+        """Suspende a liberação de tokens por `seconds` (ex.: Retry-After)."""
+        with self._lock:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+            self._tokens = 0
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Converte o header Retry-After (segundos ou data HTTP) em segundos."""
+    if not value:
+        return None
+
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class AdaptiveRateLimiter:
+    """
+    Rate limiter adaptativo: um TokenBucket por chave (host + consumer-key).
+
+    - Respostas saudáveis: a cada `success_threshold` seguidas, a taxa
+      sobe `increase_step` req/s (até `max_rate`).
+    - 429 / 5xx: a taxa cai pela metade (até `min_rate`) e, se houver
+      Retry-After, a chave fica pausada pelo tempo indicado.
+    """
+
+    def __init__(
+            self,
+            rate: float,
+            capacity: float = None,
+            min_rate: float = 0.5,
+            max_rate: float = None,
+            increase_step: float = 0.5,
+            success_threshold: int = 20
+    ):
+        # Valida já na criação: os buckets só são criados na primeira requisição
+        _check_rate(rate, capacity)
+        _check_rate(min_rate)
+        if max_rate is not None:
+            _check_rate(max_rate)
+
+        self.initial_rate = rate
+        self.capacity = capacity
+        self.min_rate = min_rate
+        self.max_rate = max_rate if max_rate is not None else rate
+        self.increase_step = increase_step
+        self.success_threshold = success_threshold
+
+        self._buckets: Dict[str, TokenBucket] = {}
+        self._successes: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def _bucket(self, key: str) -> TokenBucket:
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                bucket = TokenBucket(self.initial_rate, self.capacity)
+                self._buckets[key] = bucket
+                self._successes[key] = 0
+            return bucket
+
+    def rate(self, key: str = "default") -> float:
+        return self._bucket(key).rate
+
+    def acquire(self, key: str = "default") -> None:
+        """Bloqueia até a chave ter um token disponível."""
+        self._bucket(key).acquire()
+
+    def on_response(self, key: str, status_code: int, retry_after: Optional[str] = None) -> None:
+        """Ajusta a taxa da chave conforme a resposta recebida."""
+        bucket = self._bucket(key)
+
+        if status_code == 429 or status_code >= 500:
+            with self._lock:
+                self._successes[key] = 0
+            bucket.set_rate(max(self.min_rate, bucket.rate / 2))
+
+            pause = parse_retry_after(retry_after)
+            if pause:
+                bucket.pause(pause)
+            return
+
+        with self._lock:
+            self._successes[key] += 1
+            increase = self._successes[key] >= self.success_threshold
+            if increase:
+                self._successes[key] = 0
+
+        if increase and bucket.rate < self.max_rate:
+            bucket.set_rate(min(self.max_rate, bucket.rate + self.increase_step))
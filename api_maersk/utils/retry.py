@@ -0,0 +1,58 @@
+import random
+from typing import Optional
+
+import requests
+
+# Status transitórios: vale tentar de novo
+RETRYABLE_STATUS = frozenset({408, 429, 500, 502, 503, 504})
+
+# Métodos idempotentes por definição (repetir não muda o resultado)
+IDEMPOTENT_METHODS = frozenset({"GET", "HEAD", "OPTIONS", "PUT", "DELETE"})
+
+
+class RetryPolicy:
+    """
+    Política de retry compartilhada pelas chamadas HTTP.
+
+    - Backoff exponencial com jitter: base_delay * 2^(tentativa-1), limitado
+      a max_delay, sorteado entre metade e o valor cheio (evita que threads
+      que falharam juntas tentem de novo juntas).
+    - Só repete requisições idempotentes (GET, ou POST marcado como
+      idempotente, ex.: buscas).
+    - Retry-After, quando presente, é o tempo mínimo de espera.
+    """
+
+    def __init__(self, max_attempts: int = 3, base_delay: float = 1.0, max_delay: float = 30.0):
+        self.max_attempts = max(1, max_attempts)
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+    @staticmethod
+    def is_idempotent(method: str, idempotent: Optional[bool] = None) -> bool:
+        if idempotent is not None:
+            return idempotent
+        return method.upper() in IDEMPOTENT_METHODS
+
+    def should_retry(
+            self,
+            attempt: int,
+            idempotent: bool,
+            status_code: Optional[int] = None,
+            error: Optional[Exception] = None
+    ) -> bool:
+        """True se a tentativa `attempt` (1-based) falhou de forma transitória e ainda há tentativas."""
+        if attempt >= self.max_attempts or not idempotent:
+            return False
+
+        if error is not None:
+            return isinstance(error, (requests.exceptions.ConnectionError, requests.exceptions.Timeout))
+
+        return status_code in RETRYABLE_STATUS
+
+    def delay(self, attempt: int, retry_after: Optional[float] = None) -> float:
+        """Segundos de espera antes da tentativa seguinte a `attempt`."""
+        backoff = min(self.max_delay, self.base_delay * (2 ** (attempt - 1)))
+        backoff = random.uniform(backoff / 2, backoff)
+        if retry_after is not None:
+            backoff = max(backoff, min(retry_after, self.max_delay))
+        return backoff